@@ -8,6 +8,7 @@ except ImportError:
 import maya.OpenMayaUI as omui
 import maya.cmds as cmds
 import random
+import time
 
 class ForestBuilderToolDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
@@ -78,6 +79,15 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
         self.contentLayout.addLayout(treeLayout)
 
         
+        modeLayout = QtWidgets.QHBoxLayout()
+        self.modeLabel = QtWidgets.QLabel("Scatter Mode:")
+        self.modeCombo = QtWidgets.QComboBox()
+        self.modeCombo.addItems(["Duplicate", "Instance"])
+        modeLayout.addWidget(self.modeLabel)
+        modeLayout.addWidget(self.modeCombo)
+        self.contentLayout.addLayout(modeLayout)
+
+        
         addTreeLayout = QtWidgets.QHBoxLayout()
         self.amountLabel = QtWidgets.QLabel("จำนวนต้นไม้:")
         self.amountInput = QtWidgets.QLineEdit("5")
@@ -233,15 +243,23 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
         if target_ground == "None":
             target_ground = None
 
+        if tree_type == "Fin Tree":
+            source = "FinTree_Group"
+        elif tree_type == "Square Tree":
+            source = "SquareTree_Group"
+        elif tree_type == "Circle Tree":
+            source = "CircleTree_Group"
+        else:
+            return
+
+        mode = self.modeCombo.currentText()
+        start_nodes = len(cmds.ls())
+        start_time = time.perf_counter()
         for i in range(count):
-            if tree_type == "Fin Tree":
-                tree = cmds.duplicate("FinTree_Group")[0]
-            elif tree_type == "Square Tree":
-                tree = cmds.duplicate("SquareTree_Group")[0]
-            elif tree_type == "Circle Tree":
-                tree = cmds.duplicate("CircleTree_Group")[0]
+            if mode == "Instance":
+                tree = cmds.instance(source)[0]
             else:
-                continue
+                tree = cmds.duplicate(source)[0]
 
             x = random.uniform(-5, 5)
             z = random.uniform(-5, 5)
@@ -249,6 +267,9 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
 
             cmds.move(x, y, z, tree)
 
+        print("ForestBuilder: {} {} trees, {} nodes, {:.3f}s".format(
+            mode, count, len(cmds.ls()) - start_nodes, time.perf_counter() - start_time))
+
     def cleanup_existing_elements(self):
         try:
             for g in ["FlatPlane", "Triangle", "Circle"]:
@@ -272,4 +293,5 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
         self.cleanup_existing_elements()
         self.GroundCombo.setCurrentIndex(0)
         self.treeCombo.setCurrentIndex(0)
+        self.modeCombo.setCurrentIndex(0)
         self.amountInput.setText("5")
@@ -0,0 +1,441 @@
+import collections
+import fnmatch
+import re
+
+import numpy as np
+
+from project_meshes import primitive_mesh, transform_matrices, transform_points, triangulate
+
+
+class MayaSceneBackend:
+    is_maya = True
+
+    def __init__(self):
+        import maya.cmds
+        self._cmds = maya.cmds
+        self.command_counts = collections.Counter()
+        self._node_balance = 0
+        self._node_callbacks = []
+
+    def __getattr__(self, name):
+        # Forward to maya.cmds and count the call; the wrapper is cached on the
+        # instance so later lookups skip __getattr__ entirely.
+        func = getattr(self._cmds, name)
+        counts = self.command_counts
+
+        def command(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+
+        setattr(self, name, command)
+        return command
+
+    def start_node_tracking(self):
+        # Nodes created minus nodes deleted, kept by API callbacks so node deltas
+        # never need an ls scan. The callbacks cost a Python call per node, so they
+        # only live between start_node_tracking and stop_node_tracking.
+        import maya.api.OpenMaya as om
+
+        if self._node_callbacks:
+            return
+
+        def added(node, client_data):
+            self._node_balance += 1
+
+        def removed(node, client_data):
+            self._node_balance -= 1
+
+        self._node_callbacks = [om.MDGMessage.addNodeAddedCallback(added, "dependNode"),
+                                om.MDGMessage.addNodeRemovedCallback(removed, "dependNode")]
+
+    def stop_node_tracking(self):
+        import maya.api.OpenMaya as om
+
+        if self._node_callbacks:
+            om.MMessage.removeCallbacks(self._node_callbacks)
+        self._node_callbacks = []
+
+    def node_balance(self):
+        # Only the difference between two calls made while tracking is meaningful.
+        return self._node_balance
+
+    def mesh_arrays(self, name):
+        # World-space points and triangle indices of a mesh, read in bulk through API 2.0.
+        import maya.api.OpenMaya as om
+
+        path = om.MSelectionList().add(name).getDagPath(0)
+        path.extendToShape()
+        mesh = om.MFnMesh(path)
+        points = np.array(mesh.getPoints(om.MSpace.kWorld), dtype=np.float64)[:, :3]
+        triangles = np.array(mesh.getTriangles()[1], dtype=np.int64).reshape(-1, 3)
+        return points, triangles
+
+    def create_mesh(self, points, counts, connects, name, parent=None):
+        # One MFnMesh.create call for the whole polygon soup, run through the
+        # writer plugin's command so it is undoable.
+        import project_writer_plugin
+        from project_writer import load_writer_plugin
+
+        self.command_counts["create_mesh"] += 1
+        load_writer_plugin(self)
+        project_writer_plugin.pending_meshes.append((np.asarray(points, dtype=np.float64).tolist(),
+                                                     np.asarray(counts).tolist(),
+                                                     np.asarray(connects).tolist(), name, parent))
+        return self._cmds.forestBuilderCreateMesh()
+
+    def reset_counts(self):
+        self.command_counts.clear()
+
+
+class MemoryNode:
+    __slots__ = ("name", "type", "parents", "children", "attrs")
+
+    def __init__(self, name, node_type):
+        self.name = name
+        self.type = node_type
+        self.parents = []
+        self.children = {}
+        self.attrs = {}
+
+
+def _counted(func):
+    name = func.__name__
+
+    def command(self, *args, **kwargs):
+        self.command_counts[name] += 1
+        return func(self, *args, **kwargs)
+
+    command.__name__ = name
+    return command
+
+
+class MemorySceneBackend:
+    is_maya = False
+
+    def __init__(self):
+        self.nodes = {}
+        self.connections = {}
+        self.warnings = []
+        self.set_names = set()
+        self.command_counts = collections.Counter()
+        self._name_counters = {}
+
+    def start_node_tracking(self):
+        pass
+
+    def stop_node_tracking(self):
+        pass
+
+    def node_balance(self):
+        return len(self.nodes)
+
+    def reset_counts(self):
+        self.command_counts.clear()
+
+    def world_matrix(self, name):
+        matrix = np.eye(4)
+        node = self.nodes[name]
+        while node is not None:
+            if node.type == "transform":
+                attrs = node.attrs
+                matrix = transform_matrices(attrs["translate"], attrs["rotate"], [attrs["scale"]])[0] @ matrix
+            node = self.nodes[node.parents[0]] if node.parents else None
+        return matrix
+
+    def mesh_arrays(self, name):
+        node = self.nodes[name]
+        shape = node if node.type == "mesh" else next(
+            self.nodes[child] for child in node.children if self.nodes[child].type == "mesh")
+        if "primitive" in shape.attrs:
+            points, counts, connects = primitive_mesh(*shape.attrs["primitive"])
+        else:
+            counts, connects = shape.attrs["counts"], shape.attrs["connects"]
+        if "points" in shape.attrs:
+            # Sculpted vertex positions over the primitive's topology.
+            points = np.asarray(shape.attrs["points"], dtype=np.float64)
+        return transform_points(self.world_matrix(shape.name), points), triangulate(counts, connects)
+
+    def _unique(self, name):
+        if name not in self.nodes:
+            return name
+        base = re.sub(r"\d+$", "", name)
+        index = self._name_counters.get(base, 0)
+        while True:
+            index += 1
+            candidate = base + str(index)
+            if candidate not in self.nodes:
+                self._name_counters[base] = index
+                return candidate
+
+    def _create(self, name, node_type, parent=None):
+        node = MemoryNode(self._unique(name), node_type)
+        self.nodes[node.name] = node
+        if node_type == "transform":
+            node.attrs["translate"] = (0.0, 0.0, 0.0)
+            node.attrs["rotate"] = (0.0, 0.0, 0.0)
+            node.attrs["scale"] = (1.0, 1.0, 1.0)
+        if parent is not None:
+            self._add_child(parent, node)
+        return node
+
+    def _add_child(self, parent, child):
+        parent.children[child.name] = None
+        child.parents.append(parent.name)
+
+    def _remove_child(self, parent, child):
+        del parent.children[child.name]
+        child.parents.remove(parent.name)
+
+    def _primitive(self, command, name, kwargs):
+        transform = self._create(name, "transform")
+        shape = self._create(transform.name + "Shape", "mesh", transform)
+        shape.attrs["primitive"] = (command, dict(kwargs))
+        history = self._create(command + "1", command)
+        history.attrs.update(kwargs)
+        self.connections[shape.name + ".inMesh"] = history.name + ".output"
+        return [transform.name, history.name]
+
+    def _names(self, items):
+        if isinstance(items, str):
+            return [items]
+        names = []
+        for item in items:
+            names.extend(self._names(item))
+        return names
+
+    @_counted
+    def polyCube(self, name="pCube1", **kwargs):
+        return self._primitive("polyCube", name, kwargs)
+
+    @_counted
+    def polyCylinder(self, name="pCylinder1", **kwargs):
+        return self._primitive("polyCylinder", name, kwargs)
+
+    @_counted
+    def polyCone(self, name="pCone1", **kwargs):
+        return self._primitive("polyCone", name, kwargs)
+
+    @_counted
+    def polySphere(self, name="pSphere1", **kwargs):
+        return self._primitive("polySphere", name, kwargs)
+
+    @_counted
+    def polyCreateFacet(self, p=(), n="polySurface1", **kwargs):
+        return self._primitive("polyCreateFacet", n, dict(kwargs, p=[tuple(v) for v in p]))
+
+    @_counted
+    def create_mesh(self, points, counts, connects, name, parent=None):
+        transform = self._create(name, "transform", self.nodes[parent] if parent else None)
+        shape = self._create(transform.name + "Shape", "mesh", transform)
+        shape.attrs["points"] = np.asarray(points, dtype=np.float64)
+        shape.attrs["counts"] = np.asarray(counts)
+        shape.attrs["connects"] = np.asarray(connects)
+        return transform.name
+
+    @_counted
+    def move(self, x, y, z, *objects, **kwargs):
+        for name in self._names(objects):
+            if kwargs.get("relative") or kwargs.get("r"):
+                tx, ty, tz = self.nodes[name].attrs["translate"]
+                self.nodes[name].attrs["translate"] = (tx + x, ty + y, tz + z)
+            else:
+                self.nodes[name].attrs["translate"] = (float(x), float(y), float(z))
+
+    @_counted
+    def xform(self, obj, query=False, translation=None, rotation=None, scale=None, **kwargs):
+        attrs = self.nodes[obj].attrs
+        if query:
+            if translation:
+                return list(attrs["translate"])
+            if rotation:
+                return list(attrs["rotate"])
+            if scale:
+                return list(attrs["scale"])
+            return None
+        if translation is not None:
+            attrs["translate"] = tuple(float(v) for v in translation)
+        if rotation is not None:
+            attrs["rotate"] = tuple(float(v) for v in rotation)
+        if scale is not None:
+            attrs["scale"] = tuple(float(v) for v in scale)
+
+    @_counted
+    def group(self, *objects, name="group1", parent=None, **kwargs):
+        group = self._create(name, "transform", self.nodes[parent] if parent else None)
+        for child_name in self._names(objects):
+            child = self.nodes[child_name]
+            for parent_name in list(child.parents):
+                self._remove_child(self.nodes[parent_name], child)
+            self._add_child(group, child)
+        return group.name
+
+    @_counted
+    def parent(self, *objects, world=False, **kwargs):
+        names = self._names(objects)
+        if not world:
+            names, target = names[:-1], self.nodes[names[-1]]
+        for name in names:
+            child = self.nodes[name]
+            for parent_name in list(child.parents):
+                self._remove_child(self.nodes[parent_name], child)
+            if not world:
+                self._add_child(target, child)
+        return names
+
+    def _copy(self, node, parent):
+        copy = self._create(node.name, node.type, parent)
+        copy.attrs.update(node.attrs)
+        for child_name in node.children:
+            self._copy(self.nodes[child_name], copy)
+        return copy
+
+    @_counted
+    def duplicate(self, obj, **kwargs):
+        source = self.nodes[self._names(obj)[0]]
+        parent = self.nodes[source.parents[0]] if source.parents else None
+        return [self._copy(source, parent).name]
+
+    @_counted
+    def instance(self, obj, **kwargs):
+        source = self.nodes[self._names(obj)[0]]
+        parent = self.nodes[source.parents[0]] if source.parents else None
+        root = self._create(source.name, source.type, parent)
+        root.attrs.update(source.attrs)
+        for child_name in source.children:
+            self._add_child(root, self.nodes[child_name])
+        return [root.name]
+
+    def _delete(self, node):
+        for parent_name in list(node.parents):
+            self._remove_child(self.nodes[parent_name], node)
+        del self.nodes[node.name]
+        # Like Maya, construction history only feeding this shape goes with it.
+        source = self.connections.pop(node.name + ".inMesh", None)
+        if source is not None and source.split(".")[0] in self.nodes:
+            self._delete(self.nodes[source.split(".")[0]])
+        self.set_names.discard(node.name)
+        for set_name in self.set_names:
+            self.nodes[set_name].attrs["members"].discard(node.name)
+        for child_name in list(node.children):
+            child = self.nodes[child_name]
+            self._remove_child(node, child)
+            if not child.parents:
+                self._delete(child)
+
+    def _delete_history(self, names):
+        for name in names:
+            node = self.nodes.get(name)
+            if node is None:
+                continue
+            for shape_name in [name] + list(node.children):
+                source = self.connections.pop(shape_name + ".inMesh", None)
+                if source is not None:
+                    history = self.nodes.get(source.split(".")[0])
+                    if history is not None:
+                        self._delete(history)
+
+    @_counted
+    def delete(self, *objects, ch=False, constructionHistory=False, **kwargs):
+        names = self._names(objects)
+        if ch or constructionHistory:
+            self._delete_history(names)
+            return
+        for name in names:
+            if name not in self.nodes:
+                raise ValueError("No object matches name: " + name)
+        for name in names:
+            # Children listed after their parent are already gone.
+            node = self.nodes.get(name)
+            if node is not None:
+                self._delete(node)
+
+    @_counted
+    def objExists(self, name):
+        return name.split(".")[0] in self.nodes
+
+    @_counted
+    def ls(self, *patterns, type=None, **kwargs):
+        if patterns:
+            names = []
+            for pattern in self._names(patterns):
+                if any(c in pattern for c in "*?["):
+                    names.extend(fnmatch.filter(self.nodes, pattern))
+                elif pattern in self.nodes:
+                    names.append(pattern)
+        else:
+            names = list(self.nodes)
+        if type is not None:
+            types = [type] if isinstance(type, str) else type
+            names = [name for name in names if self.nodes[name].type in types]
+        return names
+
+    @_counted
+    def shadingNode(self, node_type, name=None, **kwargs):
+        return self._create(name or node_type + "1", node_type).name
+
+    @_counted
+    def createNode(self, node_type, name=None, parent=None, **kwargs):
+        return self._create(name or node_type + "1", node_type,
+                            self.nodes[parent] if parent else None).name
+
+    @_counted
+    def setAttr(self, attr, *values, type=None, **kwargs):
+        node, attr_name = attr.split(".", 1)
+        self.nodes[node].attrs[attr_name] = values[0] if len(values) == 1 else tuple(values)
+
+    @_counted
+    def getAttr(self, attr, **kwargs):
+        node, attr_name = attr.split(".", 1)
+        return self.nodes[node].attrs[attr_name]
+
+    @_counted
+    def addAttr(self, obj, longName=None, **kwargs):
+        self.nodes[obj].attrs.setdefault(longName, kwargs.get("defaultValue"))
+
+    @_counted
+    def connectAttr(self, source, destination, **kwargs):
+        self.connections[destination] = source
+
+    @_counted
+    def sets(self, *objects, edit=False, query=False, q=False, name="set1",
+             forceElement=None, add=None, remove=None, **kwargs):
+        if query or q:
+            members = self.nodes[self._names(objects)[0]].attrs["members"]
+            return sorted(members) or None
+        if edit or forceElement or add or remove:
+            names = self._names(objects)
+            if forceElement:
+                for set_name in self.set_names:
+                    if self.nodes[set_name].type == "shadingEngine":
+                        self.nodes[set_name].attrs["members"].difference_update(names)
+                self.nodes[forceElement].attrs["members"].update(names)
+            if add:
+                self.nodes[add].attrs["members"].update(names)
+            if remove:
+                self.nodes[remove].attrs["members"].difference_update(names)
+            return None
+        node_type = "shadingEngine" if kwargs.get("renderable") else "objectSet"
+        node = self._create(name, node_type)
+        node.attrs["members"] = set() if kwargs.get("empty") else set(self._names(objects))
+        self.set_names.add(node.name)
+        return node.name
+
+    @_counted
+    def undoInfo(self, **kwargs):
+        return None
+
+    @_counted
+    def pluginInfo(self, name, **kwargs):
+        return False
+
+    @_counted
+    def warning(self, message):
+        self.warnings.append(message)
+        print("Warning: " + message)
+
+
+def default_backend():
+    try:
+        return MayaSceneBackend()
+    except ImportError:
+        return MemorySceneBackend()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from project_meshes import primitive_mesh, transform_matrices
+from project_placement import TREE_TYPES
+
+BAKE_GROUP = "ForestBuilder_Baked"
+BAKE_SOURCE_GROUP = "ForestBuilder_BakedSource"
+
+
+def part_meshes(spec):
+    # Prototype parts in tree space, grouped by material: the same primitives
+    # PrototypeLibrary builds, as (points, counts, connects, color) arrays.
+    meshes = {}
+    for part in spec["parts"]:
+        points, counts, connects = primitive_mesh(part["command"], part["args"])
+        points = points + (0.0, part["offset"], 0.0)
+        meshes.setdefault(part["material"], []).append((points, counts, connects, part["color"]))
+    return meshes
+
+
+def merge_instances(batches):
+    # batches is a list of (mesh, matrices); every mesh is copied once per matrix
+    # and the copies are returned as one (points, counts, connects) polygon soup.
+    points, counts, connects = [], [], []
+    base = 0
+    for (mesh_points, mesh_counts, mesh_connects), matrices in batches:
+        placed = (np.einsum("nij,vj->nvi", matrices[:, :3, :3], mesh_points)
+                  + matrices[:, np.newaxis, :3, 3])
+        points.append(placed.reshape(-1, 3))
+        counts.append(np.tile(mesh_counts, len(matrices)))
+        offsets = base + np.arange(len(matrices)) * len(mesh_points)
+        connects.append((mesh_connects[np.newaxis, :] + offsets[:, np.newaxis]).reshape(-1))
+        base += len(matrices) * len(mesh_points)
+    return np.concatenate(points), np.concatenate(counts), np.concatenate(connects)
+
+
+def tile_index(positions, tile_size=None):
+    # (N, 2) tile coordinates, shifted so the lowest tile is (0, 0); no tile_size means one tile.
+    if not tile_size:
+        return np.zeros((len(positions), 2), dtype=np.int64)
+    tiles = np.floor(np.asarray(positions)[:, [0, 2]] / tile_size).astype(np.int64)
+    return tiles - tiles.min(axis=0)
+
+
+def bake_batches(layout, specs, tile_size=None):
+    # Yields (material, color, (tile_x, tile_z), points, counts, connects), one per combined mesh.
+    if not len(layout):
+        return
+    matrices = transform_matrices(layout["position"], layout["rotation"], layout["scale"])
+    tiles, tile_of = np.unique(tile_index(layout["position"], tile_size), axis=0, return_inverse=True)
+    tile_of = tile_of.reshape(-1)
+
+    by_material = {}
+    for type_id in np.unique(layout["type_id"]).tolist():
+        for material, meshes in part_meshes(specs[TREE_TYPES[type_id]]).items():
+            by_material.setdefault(material, []).append((type_id, meshes))
+
+    for material, entries in by_material.items():
+        color = entries[0][1][0][3]
+        for tile, key in enumerate(tiles.tolist()):
+            in_tile = tile_of == tile
+            batches = []
+            for type_id, meshes in entries:
+                selected = matrices[in_tile & (layout["type_id"] == type_id)]
+                if len(selected):
+                    batches.extend((mesh[:3], selected) for mesh in meshes)
+            if batches:
+                yield (material, color, tuple(key)) + merge_instances(batches)
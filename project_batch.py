@@ -0,0 +1,173 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+
+from project_backend import MemorySceneBackend
+from project_layout_file import EXTENSION, write_layout
+from project_placement import GROUND_TYPES, TREE_TYPES
+from project_prototypes import TREE_SPECS
+from project_usd import write_usda
+
+# A job file is a JSON list of jobs:
+#   {"name": "shot010", "ground_type": "Circle", "seed": 12,
+#    "trees": {"Fin Tree": 500, "Circle Tree": 200},
+#    "distribution": "Poisson Disk", "variation": {"scale": [0.8, 1.2]},
+#    "output": "layouts/shot010.fbl", "usd": "usd/shot010.usda", "scene": "scenes/shot010.mb"}
+# Only name, ground_type, trees and seed are required.
+
+
+def load_jobs(path):
+    with open(path) as handle:
+        jobs = json.load(handle)
+    base = os.path.dirname(os.path.abspath(path))
+    for job in jobs:
+        # Unknown names would otherwise plan as a plain square or fail deep inside a worker.
+        if job["ground_type"] not in GROUND_TYPES:
+            raise ValueError("job {!r}: unknown ground_type {!r}".format(job["name"], job["ground_type"]))
+        unknown = sorted(set(job["trees"]) - set(TREE_TYPES))
+        if unknown:
+            raise ValueError("job {!r}: unknown tree types {}".format(job["name"], ", ".join(unknown)))
+        job.setdefault("distribution", "Uniform")
+        job.setdefault("output", job["name"] + EXTENSION)
+        job["output"] = os.path.join(base, job["output"])
+        for key in ("usd", "scene"):
+            if job.get(key):
+                job[key] = os.path.join(base, job[key])
+    return jobs
+
+
+def plan_job(job):
+    # Runs in a worker process: the dialog's own placement path on a memory scene,
+    # so nothing here touches maya.cmds. Each job owns its seed, which keeps the
+    # result independent of which worker runs it.
+    from project_util import ForestBuilderLogic
+
+    start = time.perf_counter()
+    logic = ForestBuilderLogic(MemorySceneBackend(), seed=job["seed"])
+    for key, value in job.get("variation", {}).items():
+        logic.variation[key] = tuple(value) if isinstance(value, list) else value
+    logic.create_ground(job["ground_type"])
+    layouts = [logic.plan_trees(tree_type, count, job["distribution"])
+               for tree_type, count in job["trees"].items()]
+    return np.concatenate(layouts), logic.seed, time.perf_counter() - start
+
+
+def plan_jobs(jobs, workers=None):
+    # Stage 1: layouts for every job across a process pool, reported in job order.
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(plan_job, job): index for index, job in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            try:
+                layout, seed, seconds = future.result()
+                results[index] = {"name": jobs[index]["name"], "layout": layout, "seed": seed,
+                                  "seconds": seconds, "error": None}
+            except Exception:
+                results[index] = {"name": jobs[index]["name"], "layout": None, "seed": None,
+                                  "seconds": 0.0, "error": traceback.format_exc()}
+    return results
+
+
+def export_jobs(jobs, results):
+    # Stage 2: one layout file per planned job, plus a USD file where the job asks for one.
+    for job, result in zip(jobs, results):
+        if result["error"] is not None:
+            continue
+        start = time.perf_counter()
+        try:
+            for path in (job["output"], job.get("usd")):
+                folder = os.path.dirname(path or "")
+                if folder and not os.path.isdir(folder):
+                    os.makedirs(folder)
+            write_layout(job["output"], result["layout"], result["seed"])
+            if job.get("usd"):
+                write_usda(job["usd"], result["layout"], TREE_SPECS)
+        except OSError:
+            result["error"] = traceback.format_exc()
+        result["export_seconds"] = time.perf_counter() - start
+
+
+def apply_jobs(jobs, mode="Instance", writer="Commands"):
+    # Stage 3, run inside mayapy: builds each job's scene from its layout file.
+    # There is no memory fallback here, since it would report jobs as built without a scene.
+    try:
+        import maya.standalone
+    except ImportError:
+        raise RuntimeError("the apply stage needs Maya; run it with mayapy")
+    maya.standalone.initialize(name="python")
+    try:
+        from project_backend import MayaSceneBackend
+        from project_util import ForestBuilderLogic
+
+        results = []
+        for job in jobs:
+            start = time.perf_counter()
+            result = {"name": job["name"], "error": None}
+            try:
+                scene = MayaSceneBackend()
+                scene.file(new=True, force=True)
+                logic = ForestBuilderLogic(scene)
+                logic.create_ground(job["ground_type"])
+                logic.apply_layout(job["output"], mode, writer)
+                if job.get("scene"):
+                    scene.file(rename=job["scene"])
+                    scene.file(save=True, force=True)
+            except Exception:
+                result["error"] = traceback.format_exc()
+            result["seconds"] = time.perf_counter() - start
+            results.append(result)
+    finally:
+        maya.standalone.uninitialize()
+    return results
+
+
+def report(results):
+    failures = 0
+    for result in results:
+        if result["error"] is None:
+            trees = "" if result.get("layout") is None else "{:>9} trees ".format(len(result["layout"]))
+            print("{:<24} ok     {}{:>9.4f}s".format(result["name"], trees, result["seconds"]))
+        else:
+            failures += 1
+            print("{:<24} FAILED".format(result["name"]))
+            print(result["error"])
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate ForestBuilder layouts for a batch of jobs.")
+    parser.add_argument("stage", choices=["plan", "apply"],
+                        help="plan: compute and export layout files; apply: build scenes from them")
+    parser.add_argument("jobs", help="JSON job file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--mode", default="Instance")
+    parser.add_argument("--writer", default="Commands")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.stage == "plan":
+        start = time.perf_counter()
+        results = plan_jobs(jobs, args.workers)
+        export_jobs(jobs, results)
+        failures = report(results)
+        print("{} jobs in {:.3f}s, {} failed".format(len(jobs), time.perf_counter() - start, failures))
+    else:
+        try:
+            failures = report(apply_jobs(jobs, args.mode, args.writer))
+        except RuntimeError as error:
+            parser.error(str(error))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from project_backend import MemorySceneBackend
+from project_placement import GROUND_TYPES, TREE_TYPES
+from project_util import ForestBuilderLogic, SCATTER_MODES
+from project_writer import measure_throughput
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+# Differences below this are treated as timer noise by the regression check.
+NOISE_SECONDS = 0.005
+
+
+def measure(scene, func, *args):
+    scene.reset_counts()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "peak_bytes": peak,
+        "commands": sum(scene.command_counts.values()),
+        "command_counts": dict(sorted(scene.command_counts.items())),
+    }
+
+
+def run_case(tree_type, ground_type, count, mode, seed=0):
+    scene = MemorySceneBackend()
+    logic = ForestBuilderLogic(scene, seed=seed)
+
+    def create_elements():
+        logic.cleanup_existing_elements(keep_prototypes=True)
+        logic.create_ground(ground_type)
+        logic.create_tree(tree_type)
+
+    stages = [
+        ("create_elements", create_elements, ()),
+        ("regenerate", create_elements, ()),
+        ("add_more_trees", logic.add_more_trees, (tree_type, count, mode)),
+        ("cleanup_existing_elements", logic.cleanup_existing_elements, ()),
+    ]
+    results = []
+    for stage, func, args in stages:
+        result = {
+            "tree_type": tree_type,
+            "ground_type": ground_type,
+            "trees": count,
+            "mode": mode,
+            "stage": stage,
+        }
+        result.update(measure(scene, func, *args))
+        results.append(result)
+    return results
+
+
+def run_throughput(scene, tree_type, ground_type, count, modes, seed=0):
+    # Trees/s of both writers on the same layout; measure_throughput undoes each batch.
+    if scene.is_maya:
+        scene.file(new=True, force=True)
+        scene.undoInfo(state=True, infinity=True)
+    logic = ForestBuilderLogic(scene, seed=seed)
+    logic.create_ground(ground_type)
+    source = logic.prototypes.get(tree_type)
+    layout = logic.plan_trees(tree_type, count)
+    return [{"tree_type": tree_type, "ground_type": ground_type, "trees": len(layout),
+             "writer": writer, "mode": mode, "trees_per_second": rate}
+            for (writer, mode), rate in measure_throughput(scene, source, layout, modes).items()]
+
+
+def throughput_cases(args, scene=None):
+    # Without --maya this times the Commands writer on the memory scene; the API
+    # writer needs Maya, so run it through mayapy to compare both.
+    if scene is not None or not args.maya:
+        scene = scene or MemorySceneBackend()
+        return [result for tree_type in args.tree_types for ground_type in args.ground_types
+                for count in args.sizes
+                for result in run_throughput(scene, tree_type, ground_type, count, args.modes)]
+    try:
+        import maya.standalone
+    except ImportError:
+        raise RuntimeError("--maya needs Maya; run it with mayapy")
+    maya.standalone.initialize(name="python")
+    try:
+        from project_backend import MayaSceneBackend
+
+        return throughput_cases(args, MayaSceneBackend())
+    finally:
+        maya.standalone.uninitialize()
+
+
+def result_key(result):
+    return (result["tree_type"], result["ground_type"], result["trees"], result["mode"], result["stage"])
+
+
+def compare(results, baseline, threshold):
+    previous = {result_key(result): result for result in baseline["results"]}
+    failures = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        name = "/".join(str(part) for part in result_key(result))
+        if result["commands"] > old["commands"]:
+            failures.append("{}: commands {} -> {}".format(name, old["commands"], result["commands"]))
+        if (result["seconds"] > old["seconds"] * (1.0 + threshold)
+                and result["seconds"] - old["seconds"] > NOISE_SECONDS):
+            failures.append("{}: seconds {:.4f} -> {:.4f}".format(name, old["seconds"], result["seconds"]))
+        if result["peak_bytes"] > old["peak_bytes"] * (1.0 + threshold):
+            failures.append("{}: peak_bytes {} -> {}".format(name, old["peak_bytes"], result["peak_bytes"]))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ForestBuilder generation; headless unless --maya is given.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--tree-types", nargs="+", default=TREE_TYPES)
+    parser.add_argument("--ground-types", nargs="+", default=GROUND_TYPES)
+    parser.add_argument("--modes", nargs="+", default=SCATTER_MODES)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown / memory growth before failing")
+    parser.add_argument("--throughput", action="store_true",
+                        help="measure writer trees/s instead of the pipeline stages")
+    parser.add_argument("--maya", action="store_true",
+                        help="measure writer throughput in Maya (run with mayapy); implies --throughput")
+    args = parser.parse_args(argv)
+
+    if args.throughput or args.maya:
+        try:
+            results = throughput_cases(args)
+        except RuntimeError as error:
+            parser.error(str(error))
+        with open(args.output, "w") as handle:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "maya": args.maya, "throughput": results}, handle, indent=1, sort_keys=True)
+        return 0
+
+    results = []
+    for tree_type in args.tree_types:
+        for ground_type in args.ground_types:
+            for count in args.sizes:
+                for mode in args.modes:
+                    for result in run_case(tree_type, ground_type, count, mode):
+                        results.append(result)
+                        print("{:<12} {:<10} {:>7} {:<9} {:<26} {:>9.4f}s {:>12} B {:>8} cmds".format(
+                            tree_type, ground_type, count, mode, result["stage"],
+                            result["seconds"], result["peak_bytes"], result["commands"]))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            failures = compare(results, json.load(handle), args.threshold)
+        for failure in failures:
+            print("REGRESSION " + failure)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
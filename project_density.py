@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+
+from project_placement import ground_bounds, inside_ground
+
+
+def _read_pgm(path):
+    with open(path, "rb") as handle:
+        data = handle.read()
+    tokens = []
+    offset = 0
+    while len(tokens) < 4:
+        while data[offset:offset + 1].isspace():
+            offset += 1
+        if data[offset:offset + 1] == b"#":
+            offset = data.index(b"\n", offset) + 1
+            continue
+        end = offset
+        while not data[end:end + 1].isspace():
+            end += 1
+        tokens.append(data[offset:end])
+        offset = end
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    if magic != b"P5":
+        raise ValueError("Only binary (P5) PGM density maps are supported: " + path)
+    dtype = np.dtype(">u2") if maxval > 255 else np.dtype(np.uint8)
+    pixels = np.frombuffer(data, dtype=dtype, count=width * height, offset=offset + 1)
+    return pixels.reshape(height, width).astype(np.float32) / maxval
+
+
+def _read_qt(path):
+    try:
+        from PySide6 import QtGui
+    except ImportError:
+        from PySide2 import QtGui
+    image = QtGui.QImage(path)
+    if image.isNull():
+        raise ValueError("Cannot read density map: " + path)
+    image = image.convertToFormat(QtGui.QImage.Format_Grayscale8)
+    bits = image.constBits()
+    if hasattr(bits, "setsize"):
+        bits.setsize(image.bytesPerLine() * image.height())
+    rows = np.frombuffer(bits, dtype=np.uint8, count=image.bytesPerLine() * image.height())
+    rows = rows.reshape(image.height(), image.bytesPerLine())[:, :image.width()]
+    return rows.astype(np.float32) / 255.0
+
+
+def load_density(path):
+    # Grayscale density in [0, 1], row 0 at the ground's minimum z.
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        values = np.load(path).astype(np.float32)
+        if values.ndim == 3:
+            values = values[..., :3].mean(axis=2)
+        return np.clip(values, 0.0, 1.0)
+    if extension in (".pgm", ".pnm"):
+        return _read_pgm(path)
+    return _read_qt(path)
+
+
+class DensityMap:
+    def __init__(self, values, ground_type):
+        self.values = np.asarray(values, dtype=np.float32)
+        self.ground_type = ground_type
+        min_x, min_z, max_x, max_z = ground_bounds(ground_type)
+        self.origin = np.array([min_x, min_z])
+        self.size = np.array([max_x - min_x, max_z - min_z])
+        rows, cols = self.values.shape
+        self.pixel = self.size / np.array([cols, rows])
+        self._cdf = None
+
+    def cdf(self):
+        # Built once per map: cumulative density over pixels whose centre lies on the ground.
+        if self._cdf is None:
+            rows, cols = self.values.shape
+            weights = self.values.astype(np.float64)
+            if self.ground_type in ("Triangle", "Circle"):
+                centre_x = self.origin[0] + (np.arange(cols) + 0.5) * self.pixel[0]
+                centre_z = self.origin[1] + (np.arange(rows) + 0.5) * self.pixel[1]
+                xx, zz = np.meshgrid(centre_x, centre_z)
+                mask = inside_ground(self.ground_type, np.column_stack((xx.ravel(), zz.ravel())))
+                weights = weights * mask.reshape(rows, cols)
+            self._cdf = np.cumsum(weights.ravel())
+        return self._cdf
+
+    def sample(self, count, rng):
+        # Inverse-CDF sampling: count points jittered inside their pixel, minus the
+        # few that the jitter pushes off a Triangle or Circle edge.
+        cdf = self.cdf()
+        if count <= 0 or cdf[-1] <= 0.0:
+            return np.zeros((0, 2))
+        # Sorted queries walk the CDF in order, which is over 10x faster than random
+        # probes into a 4K map; the shuffle restores an unordered layout.
+        index = np.searchsorted(cdf, np.sort(rng.random(count)) * cdf[-1], side="right")
+        index = np.minimum(index, len(cdf) - 1)
+        rng.shuffle(index)
+        row, col = np.divmod(index, self.values.shape[1])
+        jitter = rng.random((count, 2))
+        xz = self.origin + (np.column_stack((col, row)) + jitter) * self.pixel
+        return xz[inside_ground(self.ground_type, xz)]
@@ -0,0 +1,71 @@
+import struct
+
+import numpy as np
+
+from project_placement import LAYOUT_DTYPE
+
+# Layout file: a 64-byte header followed by one contiguous little-endian array per
+# layout field, each starting on a 16-byte boundary so it can be mapped in place.
+#   magic (8s), version (u4), field count (u4), tree count (u8), seed (u8 low, u8 high)
+MAGIC = b"FBLAYOUT"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+HEADER_SIZE = 64
+ALIGN = 16
+EXTENSION = ".fbl"
+
+
+def _fields():
+    # (name, little-endian scalar dtype, per-tree shape) in LAYOUT_DTYPE order.
+    fields = []
+    for name in LAYOUT_DTYPE.names:
+        dtype = LAYOUT_DTYPE.fields[name][0]
+        fields.append((name, dtype.base.newbyteorder("<"), dtype.shape))
+    return fields
+
+
+def _offsets(count):
+    offsets = []
+    offset = HEADER_SIZE
+    for name, dtype, shape in _fields():
+        nbytes = count * dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        offsets.append((name, dtype, shape, offset, nbytes))
+        offset += -(-nbytes // ALIGN) * ALIGN
+    return offsets, offset
+
+
+def write_layout(path, layout, seed=0):
+    seed = int(seed)
+    offsets, _ = _offsets(len(layout))
+    header = HEADER.pack(MAGIC, VERSION, len(offsets), len(layout), seed & 0xFFFFFFFFFFFFFFFF, seed >> 64)
+    with open(path, "wb") as handle:
+        handle.write(header.ljust(HEADER_SIZE, b"\0"))
+        for name, dtype, shape, offset, nbytes in offsets:
+            handle.seek(offset)
+            np.ascontiguousarray(layout[name], dtype=dtype).tofile(handle)
+
+
+def open_layout(path):
+    # Memory-maps a layout file: returns ({field: read-only array view}, seed) with no parsing or copying.
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, version, field_count, count, seed_low, seed_high = HEADER.unpack_from(data[:HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise ValueError("Not a ForestBuilder layout file: " + path)
+    if version != VERSION:
+        raise ValueError("Unsupported layout file version {}: {}".format(version, path))
+    offsets, _ = _offsets(count)
+    if field_count != len(offsets) or len(data) < offsets[-1][3] + offsets[-1][4]:
+        raise ValueError("Truncated or mismatched layout file: " + path)
+    fields = {}
+    for name, dtype, shape, offset, nbytes in offsets:
+        fields[name] = data[offset:offset + nbytes].view(dtype).reshape((count,) + shape)
+    return fields, (seed_high << 64) | seed_low
+
+
+def read_layout(path):
+    # The whole file as a LAYOUT_DTYPE array (one copy out of the mapped views) and its seed.
+    fields, seed = open_layout(path)
+    layout = np.empty(len(fields["type_id"]), dtype=LAYOUT_DTYPE)
+    for name, values in fields.items():
+        layout[name] = values
+    return layout, seed
@@ -0,0 +1,65 @@
+import numpy as np
+
+from project_meshes import primitive_mesh
+
+# Level 0 is the full prototype, 1 and 2 are decimated, PROXY_LOD is a bounding box.
+LOD_NAMES = ["", "_LOD1", "_LOD2", "_Proxy"]
+PROXY_LOD = len(LOD_NAMES) - 1
+LOD_FACTORS = [1.0, 0.5, 0.25]
+# Camera distances at which a tree drops to the next level.
+LOD_DISTANCES = (20.0, 50.0, 120.0)
+
+# Subdivisions each primitive command builds with when the spec does not say,
+# and the fewest that still make a closed shape.
+SUBDIVISIONS = {
+    "polyCylinder": {"sx": 20},
+    "polyCone": {"sx": 20},
+    "polySphere": {"sx": 20, "sy": 20},
+}
+MIN_SUBDIVISIONS = {"sx": 3, "sy": 3}
+
+
+def decimate_args(command, args, factor):
+    args = dict(args)
+    for key, default in SUBDIVISIONS.get(command, {}).items():
+        args[key] = max(int(round(args.get(key, default) * factor)), MIN_SUBDIVISIONS[key])
+    return args
+
+
+def proxy_part(spec):
+    # One box around every part, coloured like the canopy (the last part).
+    points = []
+    for part in spec["parts"]:
+        part_points = primitive_mesh(part["command"], part["args"])[0]
+        points.append(part_points + (0.0, part["offset"], 0.0))
+    points = np.concatenate(points)
+    low, high = points.min(axis=0), points.max(axis=0)
+    size = (high - low).tolist()
+    canopy = spec["parts"][-1]
+    return {"name": spec["group"].replace("_Group", "") + "_Proxy", "command": "polyCube",
+            "args": {"width": size[0], "height": size[1], "depth": size[2]},
+            "offset": float(low[1] + high[1]) * 0.5, "material": canopy["material"], "color": canopy["color"]}
+
+
+def lod_spec(spec, level):
+    if level == 0:
+        return spec
+    suffix = LOD_NAMES[level]
+    if level == PROXY_LOD:
+        parts = [proxy_part(spec)]
+    else:
+        parts = [dict(part, name=part["name"] + suffix,
+                      args=decimate_args(part["command"], part["args"], LOD_FACTORS[level]))
+                 for part in spec["parts"]]
+    return {"group": spec["group"] + suffix, "parts": parts}
+
+
+def face_count(spec):
+    return sum(len(primitive_mesh(part["command"], part["args"])[1]) for part in spec["parts"])
+
+
+def select_lods(positions, camera, distances=LOD_DISTANCES):
+    # Vectorised: the LOD level of every tree for one camera position.
+    distance = np.linalg.norm(np.asarray(positions, dtype=np.float64) - np.asarray(camera, dtype=np.float64),
+                              axis=1)
+    return np.searchsorted(np.asarray(distances), distance, side="right").astype(np.uint8)
@@ -0,0 +1,150 @@
+import numpy as np
+
+# Polygon meshes are (points (V, 3), face_counts (F,), face_connects (sum(F),)),
+# the same layout MFnMesh.create and USD's faceVertexCounts/Indices use.
+
+
+def _grid_faces(rows, cols, start=0):
+    # Quads over a (rows + 1) x (cols + 1) vertex grid, counter-clockwise.
+    i, j = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    a = start + i * (cols + 1) + j
+    quads = np.stack((a, a + cols + 1, a + cols + 2, a + 1), axis=-1).reshape(-1, 4)
+    return quads
+
+
+def _weld(points, counts, connects):
+    unique, inverse = np.unique(np.round(points, 9), axis=0, return_inverse=True)
+    return unique, counts, inverse.reshape(-1)[connects]
+
+
+def cube(width=1.0, height=1.0, depth=1.0, sx=1, sy=1, sz=1):
+    half = np.array([width, height, depth], dtype=np.float64) * 0.5
+    subdivisions = (sx, sy, sz)
+    axes = np.eye(3)
+    # (normal axis, sign, u axis, v axis) with cross(u, v) pointing outward.
+    sides = [(0, 1, 1, 2), (0, -1, 2, 1), (1, 1, 2, 0), (1, -1, 0, 2), (2, 1, 0, 1), (2, -1, 1, 0)]
+    points = []
+    faces = []
+    for normal, sign, u, v in sides:
+        su, sv = subdivisions[u], subdivisions[v]
+        a = np.linspace(-half[u], half[u], su + 1)
+        b = np.linspace(-half[v], half[v], sv + 1)
+        aa, bb = np.meshgrid(a, b, indexing="ij")
+        grid = (axes[normal] * sign * half[normal]
+                + aa.reshape(-1, 1) * axes[u] + bb.reshape(-1, 1) * axes[v])
+        faces.append(_grid_faces(su, sv, sum(len(p) for p in points)))
+        points.append(grid)
+    faces = np.concatenate(faces)
+    return _weld(np.concatenate(points), np.full(len(faces), 4), faces.reshape(-1))
+
+
+def _ring(radius, y, sides):
+    theta = np.linspace(0.0, 2.0 * np.pi, sides, endpoint=False)
+    return np.column_stack((radius * np.cos(theta), np.full(sides, y), -radius * np.sin(theta)))
+
+
+def cylinder(radius=1.0, height=2.0, sx=20, sy=1, sz=1):
+    rings = [_ring(radius, y, sx) for y in np.linspace(-height * 0.5, height * 0.5, sy + 1)]
+    points = np.concatenate(rings + [[(0.0, -height * 0.5, 0.0), (0.0, height * 0.5, 0.0)]])
+    i = np.arange(sx)
+    n = (i + 1) % sx
+    side = []
+    for k in range(sy):
+        lo, hi = k * sx, (k + 1) * sx
+        side.append(np.column_stack((lo + i, lo + n, hi + n, hi + i)))
+    bottom_center, top_center = len(points) - 2, len(points) - 1
+    top = sy * sx
+    bottom_cap = np.column_stack((n, i, np.full(sx, bottom_center)))
+    top_cap = np.column_stack((top + i, top + n, np.full(sx, top_center)))
+    connects = np.concatenate([np.concatenate(side).reshape(-1), bottom_cap.reshape(-1), top_cap.reshape(-1)])
+    counts = np.concatenate([np.full(sx * sy, 4), np.full(2 * sx, 3)])
+    return points, counts, connects
+
+
+def cone(radius=1.0, height=2.0, sx=20, sy=1, sz=0):
+    base = _ring(radius, -height * 0.5, sx)
+    points = np.concatenate((base, [(0.0, height * 0.5, 0.0)]))
+    i = np.arange(sx)
+    n = (i + 1) % sx
+    side = np.column_stack((i, n, np.full(sx, sx)))
+    cap = i[::-1]
+    connects = np.concatenate((side.reshape(-1), cap))
+    counts = np.concatenate((np.full(sx, 3), [sx]))
+    return points, counts, connects
+
+
+def sphere(radius=1.0, sx=20, sy=20):
+    phi = np.linspace(0.0, np.pi, sy + 1)[1:-1]
+    rings = [_ring(radius * np.sin(p), -radius * np.cos(p), sx) for p in phi]
+    points = np.concatenate(rings + [[(0.0, -radius, 0.0), (0.0, radius, 0.0)]])
+    i = np.arange(sx)
+    n = (i + 1) % sx
+    south, north = len(points) - 2, len(points) - 1
+    last = (sy - 2) * sx
+    faces = [np.column_stack((n, i, np.full(sx, south))).reshape(-1)]
+    for k in range(sy - 2):
+        lo, hi = k * sx, (k + 1) * sx
+        faces.append(np.column_stack((lo + i, lo + n, hi + n, hi + i)).reshape(-1))
+    faces.append(np.column_stack((last + i, last + n, np.full(sx, north))).reshape(-1))
+    counts = np.concatenate((np.full(sx, 3), np.full(sx * (sy - 2), 4), np.full(sx, 3)))
+    return points, counts, np.concatenate(faces)
+
+
+def facet(p):
+    points = np.asarray(p, dtype=np.float64)
+    return points, np.array([len(points)]), np.arange(len(points))
+
+
+PRIMITIVES = {
+    "polyCube": cube,
+    "polyCylinder": cylinder,
+    "polyCone": cone,
+    "polySphere": sphere,
+    "polyCreateFacet": facet,
+}
+
+
+def primitive_mesh(command, args):
+    args = {key: value for key, value in args.items() if key not in ("name", "n")}
+    return PRIMITIVES[command](**args)
+
+
+def triangulate(counts, connects):
+    # Fan-triangulates every polygon: (T, 3) vertex indices.
+    counts = np.asarray(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    tris_per_face = counts - 2
+    face = np.repeat(np.arange(len(counts)), tris_per_face)
+    k = np.arange(len(face)) - np.repeat(np.cumsum(tris_per_face) - tris_per_face, tris_per_face)
+    first = starts[face]
+    return np.column_stack((connects[first], connects[first + k + 1], connects[first + k + 2]))
+
+
+def transform_matrices(translate, rotate, scale):
+    # Maya transforms with the default xyz rotate order, as (N, 4, 4) column-vector matrices.
+    # scale is either (N,) uniform or (N, 3) per axis.
+    translate = np.asarray(translate, dtype=np.float64).reshape(-1, 3)
+    rotate = np.radians(np.asarray(rotate, dtype=np.float64).reshape(-1, 3))
+    scale = np.asarray(scale, dtype=np.float64)
+    scale = np.broadcast_to(scale.reshape(-1, 1) if scale.ndim <= 1 else scale, (len(translate), 3))
+    cx, cy, cz = np.cos(rotate).T
+    sx, sy, sz = np.sin(rotate).T
+    matrices = np.zeros((len(translate), 4, 4))
+    # R = Rz @ Ry @ Rx
+    matrices[:, 0, 0] = cy * cz
+    matrices[:, 0, 1] = sx * sy * cz - cx * sz
+    matrices[:, 0, 2] = cx * sy * cz + sx * sz
+    matrices[:, 1, 0] = cy * sz
+    matrices[:, 1, 1] = sx * sy * sz + cx * cz
+    matrices[:, 1, 2] = cx * sy * sz - sx * cz
+    matrices[:, 2, 0] = -sy
+    matrices[:, 2, 1] = sx * cy
+    matrices[:, 2, 2] = cx * cy
+    matrices[:, :3, :3] *= scale[:, np.newaxis, :]
+    matrices[:, :3, 3] = translate
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def transform_points(matrix, points):
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
@@ -0,0 +1,103 @@
+import numpy as np
+
+TREE_TYPES = ["Fin Tree", "Square Tree", "Circle Tree"]
+GROUND_TYPES = ["Flat Plane", "Triangle", "Circle"]
+
+GROUND_SIZE = 10.0
+TRIANGLE_VERTS = [(0, 0, 5), (5, 0, -5), (-5, 0, -5)]
+CIRCLE_RADIUS = 5.0
+CIRCLE_SIDES = 20
+
+LAYOUT_DTYPE = np.dtype([
+    ("type_id", np.uint8),
+    ("position", np.float32, 3),
+    ("rotation", np.float32, 3),
+    ("scale", np.float32),
+    ("hue", np.float32),
+    ("value", np.float32),
+])
+
+# Per-tree variation ranges: scale and yaw are (min, max), hue is +/- degrees on
+# the colour wheel and value is +/- a fraction of the material's brightness.
+DEFAULT_VARIATION = {
+    "scale": (1.0, 1.0),
+    "yaw": (0.0, 360.0),
+    "hue": 0.0,
+    "value": 0.0,
+}
+
+
+def sample_ground(ground_type, count, rng):
+    # Returns (count, 2) x/z samples distributed uniformly over the ground shape.
+    if ground_type == "Triangle":
+        a, b, c = np.asarray(TRIANGLE_VERTS, dtype=np.float64)[:, [0, 2]]
+        u = rng.random(count)
+        v = rng.random(count)
+        flip = u + v > 1.0
+        u[flip] = 1.0 - u[flip]
+        v[flip] = 1.0 - v[flip]
+        return a + np.outer(u, b - a) + np.outer(v, c - a)
+
+    if ground_type == "Circle":
+        r = CIRCLE_RADIUS * np.sqrt(rng.random(count))
+        theta = rng.uniform(0.0, 2.0 * np.pi, count)
+        return np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+
+    half = GROUND_SIZE * 0.5
+    return rng.uniform(-half, half, (count, 2))
+
+
+def inside_ground(ground_type, xz):
+    # Boolean mask of which x/z points lie on the ground shape.
+    x = xz[:, 0]
+    z = xz[:, 1]
+    if ground_type == "Triangle":
+        verts = np.asarray(TRIANGLE_VERTS, dtype=np.float64)[:, [0, 2]]
+        edges = []
+        for i in range(3):
+            p, q = verts[i], verts[(i + 1) % 3]
+            edges.append((q[0] - p[0]) * (z - p[1]) - (q[1] - p[1]) * (x - p[0]))
+        edges = np.array(edges)
+        return np.all(edges >= 0.0, axis=0) | np.all(edges <= 0.0, axis=0)
+
+    if ground_type == "Circle":
+        return x * x + z * z <= CIRCLE_RADIUS * CIRCLE_RADIUS
+
+    half = GROUND_SIZE * 0.5
+    return (np.abs(x) <= half) & (np.abs(z) <= half)
+
+
+def ground_bounds(ground_type):
+    # (min_x, min_z, max_x, max_z) of the ground shape.
+    if ground_type == "Triangle":
+        verts = np.asarray(TRIANGLE_VERTS, dtype=np.float64)[:, [0, 2]]
+        lo = verts.min(axis=0)
+        hi = verts.max(axis=0)
+        return float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])
+    if ground_type == "Circle":
+        return -CIRCLE_RADIUS, -CIRCLE_RADIUS, CIRCLE_RADIUS, CIRCLE_RADIUS
+    half = GROUND_SIZE * 0.5
+    return -half, -half, half, half
+
+
+def make_layout(xz, type_id, rng, variation=None):
+    variation = dict(DEFAULT_VARIATION, **(variation or {}))
+    count = len(xz)
+    layout = np.zeros(count, dtype=LAYOUT_DTYPE)
+    layout["type_id"] = type_id
+    layout["position"][:, 0] = xz[:, 0]
+    layout["position"][:, 2] = xz[:, 1]
+    layout["rotation"][:, 1] = rng.uniform(variation["yaw"][0], variation["yaw"][1], count)
+    layout["scale"] = rng.uniform(variation["scale"][0], variation["scale"][1], count)
+    layout["hue"] = rng.uniform(-variation["hue"], variation["hue"], count)
+    layout["value"] = 1.0 + rng.uniform(-variation["value"], variation["value"], count)
+    return layout
+
+
+def has_color_variation(layout):
+    return bool(np.any(layout["hue"] != 0.0) or np.any(layout["value"] != 1.0))
+
+
+def place_trees(ground_type, tree_type, count, rng, variation=None):
+    xz = sample_ground(ground_type, count, rng)
+    return make_layout(xz, TREE_TYPES.index(tree_type), rng, variation)
@@ -0,0 +1,112 @@
+import collections
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import time
+
+# The JSON log is opt-in: the rotating handler is not safe to share between
+# processes, so batch workers and bench runs must not all default to one file.
+LOG_PATH = os.environ.get("FORESTBUILDER_PROFILE_LOG") or None
+LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Records kept in memory for the API and the dialog's stats panel.
+HISTORY = 500
+
+
+class StageProfiler:
+    # Wall time, scene commands and node-count delta per named stage. Stages may
+    # nest; each record carries its depth so callers can show the hierarchy.
+    def __init__(self, scene, log_path=LOG_PATH):
+        self.scene = scene
+        self.records = collections.deque(maxlen=HISTORY)
+        self.listeners = []
+        self.open_stages = []
+        self.log = None
+        if log_path:
+            self.log = logging.getLogger("ForestBuilder.profile." + log_path)
+            self.log.propagate = False
+            self.log.setLevel(logging.INFO)
+            if not self.log.handlers:
+                try:
+                    handler = logging.handlers.RotatingFileHandler(
+                        log_path, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+                except OSError:
+                    self.log = None
+                else:
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    self.log.addHandler(handler)
+
+    def begin(self, name):
+        # Node tracking is only switched on while at least one stage is open.
+        if not self.open_stages:
+            self.scene.start_node_tracking()
+        token = {
+            "stage": name,
+            "depth": len(self.open_stages),
+            "start": time.perf_counter(),
+            "counts": collections.Counter(self.scene.command_counts),
+            "nodes": self.scene.node_balance(),
+        }
+        self.open_stages.append(token)
+        return token
+
+    def end(self, token):
+        seconds = time.perf_counter() - token["start"]
+        if token in self.open_stages:
+            self.open_stages.remove(token)
+        counts = collections.Counter(self.scene.command_counts)
+        counts.subtract(token["counts"])
+        counts = {name: count for name, count in sorted(counts.items()) if count > 0}
+        record = {
+            "stage": token["stage"],
+            "depth": token["depth"],
+            "time": time.time(),
+            "seconds": seconds,
+            "commands": sum(counts.values()),
+            "command_counts": counts,
+            "nodes_delta": self.scene.node_balance() - token["nodes"],
+        }
+        if not self.open_stages:
+            self.scene.stop_node_tracking()
+        self.records.append(record)
+        if self.log is not None:
+            self.log.info(json.dumps(record, sort_keys=True))
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        token = self.begin(name)
+        try:
+            yield token
+        finally:
+            self.end(token)
+
+    def summary(self):
+        # Totals per stage name over the kept records.
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "commands": 0, "nodes_delta": 0})
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            total["commands"] += record["commands"]
+            total["nodes_delta"] += record["nodes_delta"]
+        return totals
+
+    def clear(self):
+        self.records.clear()
+
+
+def profiled(name):
+    # Method decorator: runs the whole call as one stage of self.profiler.
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,92 @@
+from project_lod import face_count, lod_spec
+
+PROTOTYPE_GROUP = "ForestBuilder_Prototypes"
+
+TREE_SPECS = {
+    "Fin Tree": {
+        "group": "FinTree_Group",
+        "parts": [
+            {"name": "FinTree_Trunk", "command": "polyCylinder", "args": {"radius": 0.2, "height": 2},
+             "offset": 0.0, "material": "Trunk_Mat", "color": (0.55, 0.35, 0.2)},
+            {"name": "FinTree_Leaves", "command": "polyCone", "args": {"radius": 1, "height": 3},
+             "offset": 2.5, "material": "Pine_Leaves_Mat", "color": (0.1, 0.5, 0.2)},
+        ],
+    },
+    "Square Tree": {
+        "group": "SquareTree_Group",
+        "parts": [
+            {"name": "SquareTree_Trunk", "command": "polyCube", "args": {"width": 0.5, "height": 1.5, "depth": 0.5},
+             "offset": 0.0, "material": "Trunk_Mat", "color": (0.45, 0.25, 0.1)},
+            {"name": "SquareTree_Leaves", "command": "polyCube", "args": {"width": 2, "height": 2, "depth": 2},
+             "offset": 1.75, "material": "Block_Leaves_Mat", "color": (0.2, 0.65, 0.3)},
+        ],
+    },
+    "Circle Tree": {
+        "group": "CircleTree_Group",
+        "parts": [
+            {"name": "CircleTree_Trunk", "command": "polyCylinder", "args": {"radius": 0.1, "height": 1},
+             "offset": 0.0, "material": "Trunk_Mat", "color": (0.6, 0.4, 0.2)},
+            {"name": "CircleTree_Leaves", "command": "polySphere", "args": {"radius": 1.5},
+             "offset": 2.0, "material": "Bush_Leaves_Mat", "color": (0.35, 0.7, 0.15)},
+        ],
+    },
+}
+
+
+def spec_key(spec):
+    return repr(spec)
+
+
+class PrototypeLibrary:
+    def __init__(self, scene, registry, materials):
+        self.scene = scene
+        self.registry = registry
+        self.materials = materials
+        self.specs = dict(TREE_SPECS)
+        self.built = {}
+        self.face_counts = {}
+
+    def set_spec(self, tree_type, spec):
+        self.specs[tree_type] = spec
+
+    def face_count(self, tree_type, lod=0):
+        # Counted once per spec and level; Auto LOD asks again on every camera move.
+        key = (spec_key(self.specs[tree_type]), lod)
+        if key not in self.face_counts:
+            self.face_counts[key] = face_count(lod_spec(self.specs[tree_type], lod))
+        return self.face_counts[key]
+
+    def get(self, tree_type, lod=0):
+        spec = lod_spec(self.specs[tree_type], lod)
+        key = spec_key(spec)
+        cached = self.built.get((tree_type, lod))
+        if cached is not None and cached[0] == key and self.scene.objExists(cached[1]):
+            return cached[1]
+        if cached is not None and self.scene.objExists(cached[1]):
+            self.scene.delete(cached[1])
+
+        group = self.build(spec)
+        self.built[(tree_type, lod)] = (key, group)
+        return group
+
+    def build(self, spec):
+        if not self.scene.objExists(PROTOTYPE_GROUP):
+            self.scene.createNode("transform", name=PROTOTYPE_GROUP)
+            self.scene.setAttr(PROTOTYPE_GROUP + ".visibility", 0)
+            self.registry.add(PROTOTYPE_GROUP)
+
+        parts = []
+        for part in spec["parts"]:
+            mesh = getattr(self.scene, part["command"])(name=part["name"], **part["args"])[0]
+            if part["offset"]:
+                self.scene.move(0, part["offset"], 0, mesh)
+            self.materials.queue(mesh, part["color"], part["material"])
+            self.materials.enable_variation(part["material"], part["color"])
+            parts.append(mesh)
+        self.scene.delete(parts, constructionHistory=True)
+        group = self.scene.group(parts, name=spec["group"], parent=PROTOTYPE_GROUP)
+        self.materials.flush()
+        return group
+
+    def forget(self):
+        self.built.clear()
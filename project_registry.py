@@ -0,0 +1,37 @@
+REGISTRY_SET = "ForestBuilder_Nodes"
+CACHE_SET = "ForestBuilder_Cache"
+
+
+class NodeRegistry:
+    def __init__(self, scene, set_name=REGISTRY_SET):
+        self.scene = scene
+        self.set_name = set_name
+        self.nodes = set()
+        self.load()
+
+    def load(self):
+        # Picks up nodes created by an earlier session of the tool in this scene.
+        self.nodes.clear()
+        if self.scene.objExists(self.set_name):
+            self.nodes.update(self.scene.sets(self.set_name, query=True) or [])
+
+    def add(self, names):
+        if isinstance(names, str):
+            names = [names]
+        names = list(names)
+        if not names:
+            return
+        if not self.scene.objExists(self.set_name):
+            self.scene.sets(empty=True, name=self.set_name)
+        self.scene.sets(names, add=self.set_name)
+        self.nodes.update(names)
+
+    def delete_all(self):
+        # One existence filter and one delete, both over registered names only.
+        names = list(self.nodes)
+        self.nodes.clear()
+        if not names:
+            return
+        names = self.scene.ls(names)
+        if names:
+            self.scene.delete(names)
@@ -0,0 +1,73 @@
+HUE_ATTR = "fbHue"
+VALUE_ATTR = "fbValue"
+
+
+class MaterialRegistry:
+    def __init__(self, scene, registry):
+        self.scene = scene
+        self.registry = registry
+        self.materials = {}
+        self.pending = {}
+        self.varied = set()
+
+    def shading_group(self, shader_name, color_rgb):
+        # Cached groups can vanish under an undo of Generate or a manual delete.
+        shading_group = self.materials.get(shader_name)
+        if shading_group is not None and self.scene.objExists(shading_group):
+            return shading_group
+        self.varied.discard(shader_name)
+
+        shading_group = shader_name + "SG"
+        if not (self.scene.objExists(shader_name) and self.scene.objExists(shading_group)):
+            material = self.scene.shadingNode('lambert', asShader=True, name=shader_name)
+            self.scene.setAttr(material + ".color", color_rgb[0], color_rgb[1], color_rgb[2], type="double3")
+            shading_group = self.scene.sets(renderable=True, noSurfaceShader=True, empty=True, name=shader_name + "SG")
+            self.scene.connectAttr(material + ".outColor", shading_group + ".surfaceShader", force=True)
+            self.registry.add([material, shading_group])
+        self.materials[shader_name] = shading_group
+        return shading_group
+
+    def enable_variation(self, shader_name, color_rgb):
+        # One shared network per material: base colour -> HSV, shifted by the
+        # per-tree hue (degrees) and scaled by the per-tree value, back to RGB.
+        if shader_name in self.varied:
+            return
+        self.varied.add(shader_name)
+        if not self.scene.pluginInfo("mtoa", query=True, loaded=True):
+            return
+
+        scene = self.scene
+        hue = scene.createNode("aiUserDataFloat", name=shader_name + "_Hue")
+        scene.setAttr(hue + ".attribute", HUE_ATTR, type="string")
+        scene.setAttr(hue + ".default", 0.0)
+        value = scene.createNode("aiUserDataFloat", name=shader_name + "_Value")
+        scene.setAttr(value + ".attribute", VALUE_ATTR, type="string")
+        scene.setAttr(value + ".default", 1.0)
+        to_hsv = scene.createNode("rgbToHsv", name=shader_name + "_ToHsv")
+        scene.setAttr(to_hsv + ".inRgb", color_rgb[0], color_rgb[1], color_rgb[2], type="double3")
+        shift = scene.createNode("plusMinusAverage", name=shader_name + "_HueShift")
+        scene.connectAttr(to_hsv + ".outHsv", shift + ".input3D[0]")
+        scene.connectAttr(hue + ".outValue", shift + ".input3D[1].input3Dx")
+        brightness = scene.createNode("multiplyDivide", name=shader_name + "_Value_Scale")
+        scene.connectAttr(shift + ".output3D", brightness + ".input1")
+        scene.connectAttr(value + ".outValue", brightness + ".input2Z")
+        to_rgb = scene.createNode("hsvToRgb", name=shader_name + "_ToRgb")
+        scene.connectAttr(brightness + ".output", to_rgb + ".inHsv")
+        scene.connectAttr(to_rgb + ".outRgb", shader_name + ".color", force=True)
+        self.registry.add([hue, value, to_hsv, shift, brightness, to_rgb])
+
+    def queue(self, obj_name, color_rgb, shader_name):
+        shading_group = self.shading_group(shader_name, color_rgb)
+        self.pending.setdefault(shading_group, []).append(obj_name)
+
+    def flush(self):
+        # One set membership edit per material, no selection changes.
+        for shading_group, objects in self.pending.items():
+            self.scene.sets(objects, edit=True, forceElement=shading_group)
+        self.pending.clear()
+
+    def forget(self):
+        # The nodes themselves are deleted through the node registry.
+        self.pending.clear()
+        self.materials.clear()
+        self.varied.clear()
@@ -0,0 +1,107 @@
+import math
+
+import numpy as np
+
+from project_placement import TREE_TYPES, make_layout, sample_ground
+
+# Canopy footprint of each prototype in create_tree1/2/3: cone radius,
+# half diagonal of the leaves cube (so yawed cubes don't touch) and sphere radius.
+TREE_RADII = {
+    "Fin Tree": 1.0,
+    "Square Tree": math.sqrt(2.0),
+    "Circle Tree": 1.5,
+}
+
+
+class SpatialHashGrid:
+    def __init__(self, cell_size=2.0):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+        self.max_radius = 0.0
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+        self.max_radius = 0.0
+
+    def _cell(self, x, z):
+        return int(math.floor(x / self.cell_size)), int(math.floor(z / self.cell_size))
+
+    def insert(self, x, z, radius):
+        self.cells.setdefault(self._cell(x, z), []).append((x, z, radius))
+        self.count += 1
+        if radius > self.max_radius:
+            self.max_radius = radius
+
+    def insert_many(self, xz, radii):
+        # Bins every point at once and sorts by cell, so each touched cell is
+        # extended in one go rather than once per point.
+        xz = np.asarray(xz, dtype=np.float64).reshape(-1, 2)
+        if not len(xz):
+            return
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), len(xz))
+        keys = np.floor(xz / self.cell_size).astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        keys = keys[order]
+        starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        entries = list(zip(xz[order, 0].tolist(), xz[order, 1].tolist(), radii[order].tolist()))
+        bounds = [0] + starts.tolist() + [len(entries)]
+        cells = self.cells
+        for (cx, cz), start, stop in zip(keys[bounds[:-1]].tolist(), bounds[:-1], bounds[1:]):
+            cells.setdefault((cx, cz), []).extend(entries[start:stop])
+        self.count += len(entries)
+        self.max_radius = max(self.max_radius, float(radii.max()))
+
+    def remove_many(self, xz, tolerance=1e-3):
+        # Layouts store float32 positions, so match entries within a small tolerance.
+        for x, z in np.asarray(xz).tolist():
+            cell = self.cells.get(self._cell(x, z))
+            if not cell:
+                continue
+            for i, (ox, oz, radius) in enumerate(cell):
+                if abs(ox - x) <= tolerance and abs(oz - z) <= tolerance:
+                    del cell[i]
+                    self.count -= 1
+                    break
+
+    def fits(self, x, z, radius):
+        reach = int(math.ceil((radius + self.max_radius) / self.cell_size))
+        cx, cz = self._cell(x, z)
+        cells = self.cells
+        for ix in range(cx - reach, cx + reach + 1):
+            for iz in range(cz - reach, cz + reach + 1):
+                for ox, oz, other in cells.get((ix, iz), ()):
+                    limit = radius + other
+                    dx = ox - x
+                    dz = oz - z
+                    if dx * dx + dz * dz < limit * limit:
+                        return False
+        return True
+
+
+def poisson_xz(grid, ground_type, count, radius, rng, max_attempts=30):
+    # Dart throwing against the grid: each candidate costs a constant number of
+    # cell lookups, so a batch is O(N) instead of O(N^2) pairwise checks.
+    accepted = []
+    budget = count * max_attempts
+    batch = max(count * 2, 256)
+    while len(accepted) < count and budget > 0:
+        candidates = sample_ground(ground_type, min(batch, budget), rng)
+        budget -= len(candidates)
+        for x, z in candidates.tolist():
+            if grid.fits(x, z, radius):
+                grid.insert(x, z, radius)
+                accepted.append((x, z))
+                if len(accepted) == count:
+                    break
+    return np.array(accepted, dtype=np.float64).reshape(-1, 2)
+
+
+def poisson_trees(grid, ground_type, tree_type, count, rng, radius=None, variation=None):
+    if radius is None:
+        # Sized for the largest tree the variation can produce.
+        scale = (variation or {}).get("scale", (1.0, 1.0))
+        radius = TREE_RADII[tree_type] * scale[1]
+    xz = poisson_xz(grid, ground_type, count, radius, rng)
+    return make_layout(xz, TREE_TYPES.index(tree_type), rng, variation)
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class HeightField:
+    def __init__(self, points, triangles, cell_size=None):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        corners = self.points[self.triangles]
+        xz = corners[:, :, [0, 2]]
+
+        self.origin = xz.reshape(-1, 2).min(axis=0)
+        extent = xz.reshape(-1, 2).max(axis=0) - self.origin
+        if cell_size is None:
+            cell_size = max(float(extent.max()) / max(np.sqrt(len(self.triangles)), 1.0), 1e-6)
+        self.cell_size = cell_size
+        self.shape = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+
+        # Per-triangle edge data for barycentric tests in the x/z plane.
+        self.a = xz[:, 0]
+        self.ab = xz[:, 1] - xz[:, 0]
+        self.ac = xz[:, 2] - xz[:, 0]
+        self.det = self.ab[:, 0] * self.ac[:, 1] - self.ab[:, 1] * self.ac[:, 0]
+        self.heights = corners[:, :, 1]
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        normals[normals[:, 1] < 0] *= -1.0
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        self.normals = normals / np.where(length > 0, length, 1.0)
+
+        self._build_grid(xz)
+
+    def _build_grid(self, xz):
+        # Uniform grid in CSR form: each cell lists the triangles whose x/z bounds overlap it.
+        lo = self._cells(xz.min(axis=1))
+        hi = self._cells(xz.max(axis=1))
+        width = hi[:, 0] - lo[:, 0] + 1
+        spans = width * (hi[:, 1] - lo[:, 1] + 1)
+        spans[np.abs(self.det) < 1e-12] = 0
+        tri = np.repeat(np.arange(len(spans)), spans)
+        k = np.arange(len(tri)) - np.repeat(np.cumsum(spans) - spans, spans)
+        cell_x = lo[tri, 0] + k % width[tri]
+        cell_z = lo[tri, 1] + k // width[tri]
+        cell = cell_z * self.shape[0] + cell_x
+
+        order = np.argsort(cell, kind="stable")
+        self.cell_triangles = tri[order]
+        counts = np.bincount(cell, minlength=int(self.shape.prod()))
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        self.cell_count = counts
+
+    def _cells(self, xz):
+        cells = np.floor((xz - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.shape - 1)
+
+    def query(self, xz):
+        # Highest surface under each (x, z): returns y, unit normals and a hit mask.
+        xz = np.asarray(xz, dtype=np.float64).reshape(-1, 2)
+        count = len(xz)
+        y = np.full(count, -np.inf)
+        normals = np.zeros((count, 3))
+        normals[:, 1] = 1.0
+
+        cells = self._cells(xz)
+        outside = np.any((xz < self.origin) | (xz > self.origin + self.shape * self.cell_size), axis=1)
+        cell = cells[:, 1] * self.shape[0] + cells[:, 0]
+        start = self.cell_start[cell]
+        available = np.where(outside, 0, self.cell_count[cell])
+
+        for slot in range(int(available.max()) if count else 0):
+            active = np.nonzero(available > slot)[0]
+            tri = self.cell_triangles[start[active] + slot]
+            d = xz[active] - self.a[tri]
+            u = (d[:, 0] * self.ac[tri, 1] - d[:, 1] * self.ac[tri, 0]) / self.det[tri]
+            v = (self.ab[tri, 0] * d[:, 1] - self.ab[tri, 1] * d[:, 0]) / self.det[tri]
+            eps = 1e-9
+            inside = (u >= -eps) & (v >= -eps) & (u + v <= 1.0 + eps)
+            heights = self.heights[tri]
+            h = heights[:, 0] + u * (heights[:, 1] - heights[:, 0]) + v * (heights[:, 2] - heights[:, 0])
+            better = inside & (h > y[active])
+            hit = active[better]
+            y[hit] = h[better]
+            normals[hit] = self.normals[tri[better]]
+
+        found = np.isfinite(y)
+        y[~found] = 0.0
+        return y, normals, found
+
+
+def slope_mask(normals, max_slope):
+    # True where the surface is no steeper than max_slope degrees.
+    return normals[:, 1] >= np.cos(np.radians(max_slope)) - 1e-9
+
+
+def align_rotations(normals, yaw):
+    # Euler xyz angles (degrees) that yaw a tree about its own up axis and then
+    # tilt that axis onto the surface normal.
+    normals = np.asarray(normals, dtype=np.float64)
+    yaw = np.radians(np.asarray(yaw, dtype=np.float64))
+    up = np.array([0.0, 1.0, 0.0])
+    axis = np.cross(up, normals)
+    sin = np.linalg.norm(axis, axis=1)
+    cos = normals[:, 1]
+    axis = axis / np.where(sin > 0, sin, 1.0)[:, np.newaxis]
+
+    # Rodrigues rotation taking +Y onto the normal.
+    kx, ky, kz = axis.T
+    k = np.zeros((len(normals), 3, 3))
+    k[:, 0, 1], k[:, 0, 2] = -kz, ky
+    k[:, 1, 0], k[:, 1, 2] = kz, -kx
+    k[:, 2, 0], k[:, 2, 1] = -ky, kx
+    align = np.eye(3) + sin[:, None, None] * k + (1.0 - cos)[:, None, None] * (k @ k)
+
+    spin = np.zeros((len(normals), 3, 3))
+    spin[:, 0, 0] = np.cos(yaw)
+    spin[:, 0, 2] = np.sin(yaw)
+    spin[:, 1, 1] = 1.0
+    spin[:, 2, 0] = -np.sin(yaw)
+    spin[:, 2, 2] = np.cos(yaw)
+    m = align @ spin
+
+    # Decompose m = Rz @ Ry @ Rx (Maya's xyz rotate order).
+    ry = np.arcsin(np.clip(-m[:, 2, 0], -1.0, 1.0))
+    rx = np.arctan2(m[:, 2, 1], m[:, 2, 2])
+    rz = np.arctan2(m[:, 1, 0], m[:, 0, 0])
+    return np.degrees(np.column_stack((rx, ry, rz)))
@@ -0,0 +1,116 @@
+import numpy as np
+
+from project_placement import TREE_TYPES, make_layout
+from project_writer import get_writer, undo_chunk
+
+TILES_GROUP = "ForestBuilder_Tiles"
+TILE_SIZE = 50.0
+# Expected trees per square unit of ground.
+TILE_DENSITY = 0.05
+
+
+def tile_rng(seed, ix, iz):
+    # Every tile has its own stream, so it comes out the same whichever tiles were built before it.
+    return np.random.default_rng(np.random.SeedSequence([seed, ix & 0xFFFFFFFF, iz & 0xFFFFFFFF]))
+
+
+def tile_of(xz, tile_size=TILE_SIZE):
+    x, z = np.floor(np.asarray(xz, dtype=np.float64) / tile_size).astype(np.int64).tolist()
+    return x, z
+
+
+def tile_name(ix, iz):
+    return "ForestBuilder_Tile_{}_{}".format(ix, iz).replace("-", "n")
+
+
+def plan_tile(seed, ix, iz, tile_size=TILE_SIZE, density=TILE_DENSITY, tree_types=TREE_TYPES, variation=None):
+    # Pure placement math for one tile: a Poisson-distributed count of uniform trees.
+    rng = tile_rng(seed, ix, iz)
+    count = rng.poisson(density * tile_size * tile_size)
+    xz = (np.array([ix, iz], dtype=np.float64) + rng.random((count, 2))) * tile_size
+    type_ids = np.array([TREE_TYPES.index(tree_type) for tree_type in tree_types])
+    return make_layout(xz, type_ids[rng.integers(len(type_ids), size=count)], rng, variation)
+
+
+def tiles_near(center_xz, radius, tile_size=TILE_SIZE):
+    # Tiles whose square overlaps the circle, nearest first.
+    center = np.asarray(center_xz, dtype=np.float64)
+    low = np.floor((center - radius) / tile_size).astype(np.int64)
+    high = np.floor((center + radius) / tile_size).astype(np.int64)
+    ix, iz = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1), indexing="ij")
+    tiles = np.column_stack((ix.ravel(), iz.ravel()))
+    nearest = np.clip(center, tiles * tile_size, (tiles + 1) * tile_size)
+    distance = np.linalg.norm(nearest - center, axis=1)
+    order = np.argsort(distance, kind="stable")
+    return [tuple(tile) for tile in tiles[order][distance[order] <= radius].tolist()]
+
+
+class TiledForest:
+    # Streams fixed-size tiles of forest in and out around a point of interest.
+    def __init__(self, logic, tile_size=TILE_SIZE, density=TILE_DENSITY):
+        self.logic = logic
+        self.scene = logic.scene
+        self.tile_size = tile_size
+        self.density = density
+        self.tree_types = list(TREE_TYPES)
+        self.mode = "Instance"
+        self.writer = "Commands"
+        self.loaded = {}
+
+    def plan(self, ix, iz):
+        layout = plan_tile(self.logic.seed, ix, iz, self.tile_size, self.density, self.tree_types,
+                           self.logic.variation)
+        # Only terrain set with set_terrain describes the tiled area; the built-in
+        # 10x10 grounds would reject every tree outside their own bounds.
+        if not self.logic.custom_terrain:
+            return layout
+        return self.logic.conform_to_terrain(layout)[0]
+
+    def root(self):
+        if not self.scene.objExists(TILES_GROUP):
+            self.scene.createNode("transform", name=TILES_GROUP)
+            self.logic.registry.add(TILES_GROUP)
+        return TILES_GROUP
+
+    def load(self, ix, iz):
+        layout = self.plan(ix, iz)
+        group = self.scene.createNode("transform", name=tile_name(ix, iz), parent=self.root())
+        self.logic.registry.add(group)
+        writer = get_writer(self.writer, self.scene)
+        for type_id in np.unique(layout["type_id"]).tolist():
+            source = self.logic.prototypes.get(TREE_TYPES[type_id])
+            writer.write(layout[layout["type_id"] == type_id], source, self.mode, group)
+        self.loaded[(ix, iz)] = group
+        return group
+
+    def unload(self, ix, iz):
+        group = self.loaded.pop((ix, iz), None)
+        if group is not None and self.scene.objExists(group):
+            self.scene.delete(group)
+
+    def unload_all(self):
+        for tile in list(self.loaded):
+            self.unload(*tile)
+
+    def regenerate(self, ix, iz):
+        # Rebuilds one tile from its seed; every other tile's nodes are left alone.
+        with undo_chunk(self.scene, "ForestBuilder Regenerate Tile"):
+            self.unload(ix, iz)
+            return self.load(ix, iz)
+
+    def update(self, center_xz, radius):
+        wanted = tiles_near(center_xz, radius, self.tile_size)
+        keep = set(wanted)
+        stale = [tile for tile in self.loaded if tile not in keep]
+        fresh = [tile for tile in wanted if tile not in self.loaded]
+        if stale or fresh:
+            with undo_chunk(self.scene, "ForestBuilder Stream Tiles"):
+                for tile in stale:
+                    self.unload(*tile)
+                for tile in fresh:
+                    self.load(*tile)
+        return fresh, stale
+
+    def forget(self):
+        # The groups themselves are deleted through the node registry.
+        self.loaded.clear()
@@ -5,16 +5,54 @@ except ImportError:
     from PySide2 import QtCore, QtWidgets, QtGui
     from shiboken2 import wrapInstance
 
-from project_util import ForestBuilderLogic
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+
+from project_util import ForestBuilderLogic, SCATTER_MODES, DISTRIBUTIONS
+from project_writer import WRITERS, undo_chunk
+from project_tiles import TILE_SIZE, tile_of
+from project_layout_file import EXTENSION as LAYOUT_EXTENSION
+from project_placement import TREE_TYPES
+
+# Trees written per scene call batch, and how long one timer tick may block the UI.
+WRITE_CHUNK = 200
+TIME_BOX = 0.05
+# How often Auto LOD reads the camera, and how far it must move to trigger a pass.
+LOD_POLL_MS = 250
+LOD_MOVE_TOLERANCE = 0.5
+STREAM_RADIUS = 100.0
+# Stage records shown in the Performance panel.
+STATS_ROWS = 200
 
 class ForestBuilderToolDialog(QtWidgets.QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, backend=None):
         super().__init__(parent)
         self.setWindowTitle('Forest Builder')
         self.resize(450, 500)
 
         
-        self.logic = ForestBuilderLogic()
+        self.logic = ForestBuilderLogic(backend)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.planFuture = None
+        self.writeJob = None
+        self.jobStage = None
+        self.writeStage = None
+        self.jobRecord = 0
+        self.layout = None
+        self.cancelled = False
+        self.jobTimer = QtCore.QTimer(self)
+        self.jobTimer.setInterval(0)
+        self.jobTimer.timeout.connect(self.step_job)
+        self.lodCamera = None
+        self.lodTimer = QtCore.QTimer(self)
+        self.lodTimer.setInterval(LOD_POLL_MS)
+        self.lodTimer.timeout.connect(self.poll_camera)
+        self.streamTimer = QtCore.QTimer(self)
+        self.streamTimer.setInterval(LOD_POLL_MS)
+        self.streamTimer.timeout.connect(self.stream_tiles)
 
         self.setStyleSheet("""
             QDialog {
@@ -72,6 +110,78 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
         self.contentLayout.addLayout(treeLayout)
 
         
+        modeLayout = QtWidgets.QHBoxLayout()
+        self.modeLabel = QtWidgets.QLabel("Scatter Mode:")
+        self.modeCombo = QtWidgets.QComboBox()
+        self.modeCombo.addItems(SCATTER_MODES)
+        modeLayout.addWidget(self.modeLabel)
+        modeLayout.addWidget(self.modeCombo)
+        self.contentLayout.addLayout(modeLayout)
+
+        
+        distributionLayout = QtWidgets.QHBoxLayout()
+        self.distributionLabel = QtWidgets.QLabel("Distribution:")
+        self.distributionCombo = QtWidgets.QComboBox()
+        self.distributionCombo.addItems(DISTRIBUTIONS)
+        distributionLayout.addWidget(self.distributionLabel)
+        distributionLayout.addWidget(self.distributionCombo)
+        self.contentLayout.addLayout(distributionLayout)
+
+        
+        densityLayout = QtWidgets.QHBoxLayout()
+        self.densityButton = QtWidgets.QPushButton("Density Map...")
+        self.densityButton.clicked.connect(self.choose_density_map)
+        self.densityPathLabel = QtWidgets.QLabel("-")
+        self.densitySpin = QtWidgets.QDoubleSpinBox()
+        self.densitySpin.setRange(0.0, 10.0)
+        self.densitySpin.setSingleStep(0.1)
+        self.densitySpin.setValue(1.0)
+        self.densitySpin.setPrefix("x")
+        densityLayout.addWidget(self.densityButton)
+        densityLayout.addWidget(self.densityPathLabel)
+        densityLayout.addWidget(self.densitySpin)
+        self.contentLayout.addLayout(densityLayout)
+
+        
+        writerLayout = QtWidgets.QHBoxLayout()
+        self.writerLabel = QtWidgets.QLabel("Scene Writer:")
+        self.writerCombo = QtWidgets.QComboBox()
+        self.writerCombo.addItems(WRITERS)
+        writerLayout.addWidget(self.writerLabel)
+        writerLayout.addWidget(self.writerCombo)
+        self.contentLayout.addLayout(writerLayout)
+
+        
+        slopeLayout = QtWidgets.QHBoxLayout()
+        self.slopeLabel = QtWidgets.QLabel("Max Slope:")
+        self.slopeSpin = QtWidgets.QDoubleSpinBox()
+        self.slopeSpin.setRange(0.0, 90.0)
+        self.slopeSpin.setValue(90.0)
+        self.slopeSpin.setSuffix(" deg")
+        self.alignCheck = QtWidgets.QCheckBox("Align to Slope")
+        slopeLayout.addWidget(self.slopeLabel)
+        slopeLayout.addWidget(self.slopeSpin)
+        slopeLayout.addWidget(self.alignCheck)
+        self.contentLayout.addLayout(slopeLayout)
+
+        
+        variationLayout = QtWidgets.QHBoxLayout()
+        self.variationLabel = QtWidgets.QLabel("Variation:")
+        self.scaleSpin = QtWidgets.QDoubleSpinBox()
+        self.scaleSpin.setRange(0.0, 0.9)
+        self.scaleSpin.setSingleStep(0.05)
+        self.scaleSpin.setPrefix("Scale ±")
+        self.hueSpin = QtWidgets.QDoubleSpinBox()
+        self.hueSpin.setRange(0.0, 180.0)
+        self.hueSpin.setSingleStep(5.0)
+        self.hueSpin.setPrefix("Hue ±")
+        self.hueSpin.setSuffix(" deg")
+        variationLayout.addWidget(self.variationLabel)
+        variationLayout.addWidget(self.scaleSpin)
+        variationLayout.addWidget(self.hueSpin)
+        self.contentLayout.addLayout(variationLayout)
+
+        
         addTreeLayout = QtWidgets.QHBoxLayout()
         self.amountLabel = QtWidgets.QLabel("จำนวนต้นไม้:")
         self.amountInput = QtWidgets.QLineEdit("5")
@@ -83,6 +193,96 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
         addTreeLayout.addWidget(self.addTreeButton)
         self.contentLayout.addLayout(addTreeLayout)
 
+        
+        progressLayout = QtWidgets.QHBoxLayout()
+        self.progressBar = QtWidgets.QProgressBar()
+        self.progressBar.setValue(0)
+        self.rateLabel = QtWidgets.QLabel("0 trees/s")
+        self.cancelButton = QtWidgets.QPushButton("Cancel")
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.clicked.connect(self.cancel_job)
+        progressLayout.addWidget(self.progressBar)
+        progressLayout.addWidget(self.rateLabel)
+        progressLayout.addWidget(self.cancelButton)
+        self.contentLayout.addLayout(progressLayout)
+
+        
+        bakeLayout = QtWidgets.QHBoxLayout()
+        self.tileSpin = QtWidgets.QDoubleSpinBox()
+        self.tileSpin.setRange(0.0, 1000.0)
+        self.tileSpin.setSingleStep(1.0)
+        self.tileSpin.setPrefix("Tile ")
+        self.tileSpin.setSpecialValueText("Single Mesh")
+        self.keepSourceCheck = QtWidgets.QCheckBox("Keep Source")
+        self.keepSourceCheck.setChecked(True)
+        self.bakeButton = QtWidgets.QPushButton("Bake")
+        self.bakeButton.clicked.connect(self.bake_forest)
+        bakeLayout.addWidget(self.tileSpin)
+        bakeLayout.addWidget(self.keepSourceCheck)
+        bakeLayout.addWidget(self.bakeButton)
+        self.contentLayout.addLayout(bakeLayout)
+
+        
+        lodLayout = QtWidgets.QHBoxLayout()
+        self.autoLodCheck = QtWidgets.QCheckBox("Auto LOD")
+        self.autoLodCheck.toggled.connect(self.toggle_auto_lod)
+        self.lodButton = QtWidgets.QPushButton("Update LOD")
+        self.lodButton.clicked.connect(self.update_lods)
+        self.lodLabel = QtWidgets.QLabel("")
+        lodLayout.addWidget(self.autoLodCheck)
+        lodLayout.addWidget(self.lodButton)
+        lodLayout.addWidget(self.lodLabel)
+        self.contentLayout.addLayout(lodLayout)
+
+        
+        tileLayout = QtWidgets.QHBoxLayout()
+        self.tileSizeSpin = QtWidgets.QDoubleSpinBox()
+        self.tileSizeSpin.setRange(1.0, 10000.0)
+        self.tileSizeSpin.setValue(TILE_SIZE)
+        self.tileSizeSpin.setPrefix("Tile ")
+        self.tileSizeSpin.valueChanged.connect(self.change_tile_size)
+        self.radiusSpin = QtWidgets.QDoubleSpinBox()
+        self.radiusSpin.setRange(1.0, 100000.0)
+        self.radiusSpin.setValue(STREAM_RADIUS)
+        self.radiusSpin.setPrefix("Radius ")
+        self.streamCheck = QtWidgets.QCheckBox("Stream Tiles")
+        self.streamCheck.toggled.connect(self.toggle_streaming)
+        self.regenerateTileButton = QtWidgets.QPushButton("Regenerate Tile")
+        self.regenerateTileButton.clicked.connect(self.regenerate_tile)
+        tileLayout.addWidget(self.tileSizeSpin)
+        tileLayout.addWidget(self.radiusSpin)
+        tileLayout.addWidget(self.streamCheck)
+        tileLayout.addWidget(self.regenerateTileButton)
+        self.contentLayout.addLayout(tileLayout)
+
+        
+        layoutFileLayout = QtWidgets.QHBoxLayout()
+        self.saveLayoutButton = QtWidgets.QPushButton("Save Layout...")
+        self.saveLayoutButton.clicked.connect(self.save_layout)
+        self.loadLayoutButton = QtWidgets.QPushButton("Load Layout...")
+        self.loadLayoutButton.clicked.connect(self.load_layout)
+        layoutFileLayout.addWidget(self.saveLayoutButton)
+        layoutFileLayout.addWidget(self.loadLayoutButton)
+        self.exportUsdButton = QtWidgets.QPushButton("Export USD...")
+        self.exportUsdButton.clicked.connect(self.export_usd)
+        layoutFileLayout.addWidget(self.exportUsdButton)
+        self.contentLayout.addLayout(layoutFileLayout)
+
+        
+        self.statsToggle = QtWidgets.QToolButton()
+        self.statsToggle.setText("Performance")
+        self.statsToggle.setCheckable(True)
+        self.statsToggle.setToolButtonStyle(QtCore.Qt.ToolButtonTextBesideIcon)
+        self.statsToggle.setArrowType(QtCore.Qt.RightArrow)
+        self.statsToggle.toggled.connect(self.toggle_stats)
+        self.statsTable = QtWidgets.QTreeWidget()
+        self.statsTable.setHeaderLabels(["Stage", "ms", "Commands", "Nodes"])
+        self.statsTable.setRootIsDecorated(False)
+        self.statsTable.setVisible(False)
+        self.contentLayout.addWidget(self.statsToggle)
+        self.contentLayout.addWidget(self.statsTable)
+        self.logic.profiler.listeners.append(self.add_stage_stats)
+
         # Generate Button
         self.generateButton = QtWidgets.QPushButton("Generate")
         self.generateButton.clicked.connect(self.create_elements)
@@ -95,24 +295,293 @@ class ForestBuilderToolDialog(QtWidgets.QDialog):
 
     
     def create_elements(self):
-        self.logic.cleanup_existing_elements()
         ground_type = self.GroundCombo.currentText()
         tree_type = self.treeCombo.currentText()
-        self.logic.create_ground(ground_type)
-        self.logic.create_tree(tree_type)
+        with undo_chunk(self.logic.scene, "ForestBuilder Generate"), self.logic.profiler.stage("create_elements"):
+            self.logic.cleanup_existing_elements(keep_prototypes=True)
+            self.logic.create_ground(ground_type)
+            self.logic.create_tree(tree_type)
 
     def add_more_trees(self):
+        if self.jobTimer.isActive():
+            return
         try:
             count = int(self.amountInput.text())
         except ValueError:
-            import maya.cmds as cmds
-            cmds.warning("กรุณากรอกตัวเลขจำนวนต้นไม้ที่ถูกต้อง")
+            self.logic.scene.warning("กรุณากรอกตัวเลขจำนวนต้นไม้ที่ถูกต้อง")
+            return
+        tree_type = self.treeCombo.currentText()
+        if tree_type == "None":
+            self.logic.scene.warning("กรุณาเลือกชนิดต้นไม้ก่อน")
+            return
+
+        if self.distributionCombo.currentText() == "Density Map" and self.logic.density_values is None:
+            self.logic.scene.warning("กรุณาเลือกภาพ Density Map ก่อน")
+            return
+        self.logic.density_multipliers[tree_type] = self.densitySpin.value()
+        self.logic.max_slope = self.slopeSpin.value()
+        self.logic.align_to_slope = self.alignCheck.isChecked()
+        scale = self.scaleSpin.value()
+        self.logic.variation["scale"] = (1.0 - scale, 1.0 + scale)
+        self.logic.variation["hue"] = self.hueSpin.value()
+        self.logic.refresh_terrain()
+
+        self.jobArgs = (tree_type, count, self.modeCombo.currentText(), self.writerCombo.currentText())
+        distribution = self.distributionCombo.currentText()
+        self.jobStage = self.logic.profiler.begin("add_more_trees")
+        self.writeStage = None
+        self.planFuture = self.executor.submit(self.logic.plan_trees, tree_type, count, distribution)
+        self.writeJob = None
+        self.cancelled = False
+        self.written = 0
+        self.progressBar.setRange(0, 0)
+        self.rateLabel.setText("0 trees/s")
+        self.set_job_running(True)
+        self.jobTimer.start()
+
+    def bake_forest(self):
+        self.logic.bake_forest(self.tileSpin.value() or None, self.keepSourceCheck.isChecked())
+
+    def update_lods(self):
+        if self.jobTimer.isActive():
             return
+        self.lodCamera = self.logic.camera_position()
+        stats = self.logic.update_lods(self.lodCamera, writer=self.writerCombo.currentText())
+        if stats is not None:
+            self.lodLabel.setText("{} faces ({} saved)".format(stats["faces"], stats["faces_saved"]))
+
+    def toggle_auto_lod(self, enabled):
+        if enabled:
+            self.lodCamera = None
+            self.lodTimer.start()
+        else:
+            self.lodTimer.stop()
+
+    def poll_camera(self):
+        # Only re-selects LODs once the camera has actually moved.
+        camera = self.logic.camera_position()
+        if self.lodCamera is None or np.linalg.norm(camera - self.lodCamera) > LOD_MOVE_TOLERANCE:
+            self.update_lods()
+
+    def toggle_streaming(self, enabled):
+        if enabled:
+            self.stream_tiles()
+            self.streamTimer.start()
+        else:
+            self.streamTimer.stop()
+
+    def stream_tiles(self):
+        if self.jobTimer.isActive():
+            return
+        tiles = self.logic.tiles
         tree_type = self.treeCombo.currentText()
-        self.logic.add_more_trees(tree_type, count)
+        tiles.tree_types = list(TREE_TYPES) if tree_type == "None" else [tree_type]
+        tiles.mode = self.modeCombo.currentText()
+        tiles.writer = self.writerCombo.currentText()
+        camera = self.logic.camera_position()
+        tiles.update(camera[[0, 2]], self.radiusSpin.value())
+
+    def change_tile_size(self, size):
+        # Tile indices mean something else at a new size, so everything streams in again.
+        with undo_chunk(self.logic.scene, "ForestBuilder Stream Tiles"):
+            self.logic.tiles.unload_all()
+        self.logic.tiles.tile_size = size
+        if self.streamCheck.isChecked():
+            self.stream_tiles()
+
+    def regenerate_tile(self):
+        tiles = self.logic.tiles
+        tile = tile_of(self.logic.camera_position()[[0, 2]], tiles.tile_size)
+        if tile not in tiles.loaded:
+            self.logic.scene.warning("ไม่มี Tile ที่โหลดอยู่ใต้กล้อง")
+            return
+        tiles.regenerate(*tile)
+
+    def save_layout(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Layout", "", "ForestBuilder Layout (*{})".format(LAYOUT_EXTENSION))
+        if not path:
+            return
+        try:
+            self.logic.save_layout(path)
+        except OSError as error:
+            self.logic.scene.warning("บันทึก Layout ไม่สำเร็จ: {}".format(error))
+
+    def export_usd(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export USD", "", "USD ASCII (*.usda)")
+        if not path:
+            return
+        try:
+            self.logic.export_usd(path)
+        except OSError as error:
+            self.logic.scene.warning("Export USD ไม่สำเร็จ: {}".format(error))
+
+    def load_layout(self):
+        if self.jobTimer.isActive():
+            return
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Load Layout", "", "ForestBuilder Layout (*{})".format(LAYOUT_EXTENSION))
+        if not path:
+            return
+        try:
+            self.logic.apply_layout(path, self.modeCombo.currentText(), self.writerCombo.currentText())
+        except (OSError, ValueError) as error:
+            self.logic.scene.warning("โหลด Layout ไม่สำเร็จ: {}".format(error))
+
+    def toggle_stats(self, expanded):
+        self.statsToggle.setArrowType(QtCore.Qt.DownArrow if expanded else QtCore.Qt.RightArrow)
+        self.statsTable.setVisible(expanded)
+
+    def add_stage_stats(self, record):
+        # Newest stage first; nested stages are indented under the one that ran them.
+        item = QtWidgets.QTreeWidgetItem([
+            "  " * record["depth"] + record["stage"],
+            "{:.1f}".format(record["seconds"] * 1000.0),
+            str(record["commands"]),
+            "{:+d}".format(record["nodes_delta"]),
+        ])
+        item.setToolTip(2, ", ".join("{} {}".format(name, count) for name, count in record["command_counts"].items()))
+        self.statsTable.insertTopLevelItem(0, item)
+        while self.statsTable.topLevelItemCount() > STATS_ROWS:
+            self.statsTable.takeTopLevelItem(STATS_ROWS)
+
+    def choose_density_map(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Density Map", "", "Images (*.png *.jpg *.tif *.pgm *.npy)")
+        if not path:
+            return
+        try:
+            self.logic.load_density_map(path)
+        except (OSError, ValueError) as error:
+            self.logic.scene.warning("โหลด Density Map ไม่สำเร็จ: {}".format(error))
+            return
+        self.densityPathLabel.setText(os.path.basename(path))
+
+    def step_job(self):
+        if self.writeJob is None:
+            if not self.planFuture.done():
+                return
+            tree_type, count, mode, writer = self.jobArgs
+            try:
+                self.layout = self.planFuture.result()
+            except Exception as error:
+                self.logic.scene.warning("วางตำแหน่งต้นไม้ไม่สำเร็จ: {}".format(error))
+                self.finish_job()
+                return
+            if self.cancelled:
+                self.logic.forget_trees(self.layout)
+                self.finish_job()
+                return
+            if len(self.layout) < count:
+                self.logic.scene.warning("วางต้นไม้ได้ {} จาก {} ต้น".format(len(self.layout), count))
+            self.progressBar.setRange(0, max(len(self.layout), 1))
+            self.writeJob = self.logic.iter_write_trees(self.layout, tree_type, mode, writer, WRITE_CHUNK)
+            self.jobRecord = len(self.logic.placed)
+            self.writeStage = self.logic.profiler.begin("write_trees")
+            self.writeStart = time.perf_counter()
+
+        # Maya stays interactive between ticks; a Ctrl+Z then undoes our last tick.
+        if self.logic.drop_undone_trees(self.jobRecord):
+            self.logic.scene.warning("Undo ระหว่างเพิ่มต้นไม้ หยุดการเพิ่มต้นไม้")
+            self.cancelled = True
+        if self.cancelled:
+            self.logic.forget_trees(self.layout[self.written:])
+            self.finish_job()
+            return
+
+        # Each tick is its own undo step, so no chunk is ever left open across the event loop.
+        deadline = time.perf_counter() + TIME_BOX
+        with undo_chunk(self.logic.scene, "ForestBuilder Add Trees"):
+            try:
+                while time.perf_counter() < deadline:
+                    self.written = next(self.writeJob)
+            except StopIteration:
+                self.writeJob = None
+        if self.writeJob is None:
+            self.finish_job()
+            return
+        self.update_progress()
+
+    def update_progress(self):
+        self.progressBar.setValue(self.written)
+        seconds = time.perf_counter() - self.writeStart
+        if seconds > 0:
+            self.rateLabel.setText("{:.0f} trees/s".format(self.written / seconds))
+
+    def cancel_job(self):
+        # Chunks are written whole, so stopping between them leaves no half-built trees.
+        # Planning can't be interrupted; step_job discards its result once it arrives.
+        self.cancelled = True
+        self.cancelButton.setEnabled(False)
+
+    def finish_job(self):
+        self.jobTimer.stop()
+        if self.writeJob is not None:
+            self.writeJob.close()
+        if self.writeStage is not None:
+            self.update_progress()
+            self.logic.profiler.end(self.writeStage)
+        self.logic.profiler.end(self.jobStage)
+        self.writeJob = None
+        self.writeStage = None
+        self.layout = None
+        self.planFuture = None
+        self.set_job_running(False)
+
+    def set_job_running(self, running):
+        self.cancelButton.setEnabled(running)
+        self.addTreeButton.setEnabled(not running)
+        self.generateButton.setEnabled(not running)
+        self.restartButton.setEnabled(not running)
+        self.bakeButton.setEnabled(not running)
+        self.loadLayoutButton.setEnabled(not running)
+        self.regenerateTileButton.setEnabled(not running)
+
+    def stop_jobs(self):
+        # Closing mid-job would leave the Add Trees undo chunk open and the timers
+        # writing into a scene nobody is watching.
+        if self.jobTimer.isActive():
+            self.cancelled = True
+            if self.writeJob is None:
+                # Planning can't be interrupted; wait for it so its trees can be forgotten.
+                try:
+                    self.logic.forget_trees(self.planFuture.result())
+                except Exception as error:
+                    self.logic.scene.warning("วางตำแหน่งต้นไม้ไม่สำเร็จ: {}".format(error))
+            else:
+                self.logic.drop_undone_trees(self.jobRecord)
+                self.logic.forget_trees(self.layout[self.written:])
+            self.finish_job()
+        self.autoLodCheck.setChecked(False)
+        self.streamCheck.setChecked(False)
+        self.logic.scene.stop_node_tracking()
+
+    def closeEvent(self, event):
+        self.stop_jobs()
+        super().closeEvent(event)
+
+    def reject(self):
+        self.stop_jobs()
+        super().reject()
 
     def restart_scene(self):
-        self.logic.cleanup_existing_elements()
+        # Auto LOD and streaming would otherwise keep polling and rebuild trees in the emptied scene.
+        self.autoLodCheck.setChecked(False)
+        self.streamCheck.setChecked(False)
+        with undo_chunk(self.logic.scene, "ForestBuilder Restart"), self.logic.profiler.stage("restart_scene"):
+            self.logic.cleanup_existing_elements()
         self.GroundCombo.setCurrentIndex(0)
         self.treeCombo.setCurrentIndex(0)
+        self.modeCombo.setCurrentIndex(0)
+        self.distributionCombo.setCurrentIndex(0)
+        self.writerCombo.setCurrentIndex(0)
+        self.slopeSpin.setValue(90.0)
+        self.alignCheck.setChecked(False)
+        self.scaleSpin.setValue(0.0)
+        self.hueSpin.setValue(0.0)
+        self.tileSpin.setValue(0.0)
+        self.keepSourceCheck.setChecked(True)
+        self.lodLabel.setText("")
+        self.tileSizeSpin.setValue(TILE_SIZE)
+        self.radiusSpin.setValue(STREAM_RADIUS)
         self.amountInput.setText("5")
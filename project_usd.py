@@ -0,0 +1,89 @@
+import numpy as np
+
+from project_meshes import primitive_mesh
+from project_placement import TREE_TYPES
+
+# Arrays are formatted and written this many elements at a time, so exporting a
+# million trees never holds more than one chunk of text in memory.
+CHUNK_SIZE = 65536
+INTEGER = "%d"
+FLOAT = "%.7g"
+VECTOR = "(" + ", ".join([FLOAT] * 3) + ")"
+QUATERNION = "(" + ", ".join([FLOAT] * 4) + ")"
+
+
+def euler_to_quaternions(rotation):
+    # Maya xyz Euler degrees (R = Rz @ Ry @ Rx) to (N, 4) unit quaternions as (w, x, y, z).
+    half = np.radians(np.asarray(rotation, dtype=np.float64)) * 0.5
+    cx, cy, cz = np.cos(half).T
+    sx, sy, sz = np.sin(half).T
+    return np.column_stack((
+        cz * cy * cx + sz * sy * sx,
+        cz * cy * sx - sz * sy * cx,
+        cz * sy * cx + sz * cy * sx,
+        sz * cy * cx - cz * sy * sx,
+    ))
+
+
+def _write_array(handle, indent, declaration, values, row_format, chunk_size=CHUNK_SIZE, convert=None):
+    # row_format is a printf-style pattern for one element; each chunk is formatted
+    # with a single % call. convert, if given, turns a chunk of values into those rows.
+    handle.write("{}{} = [".format(indent, declaration))
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        if convert is not None:
+            chunk = convert(chunk)
+        if start:
+            handle.write(", ")
+        handle.write(", ".join([row_format] * len(chunk)) % tuple(np.ravel(chunk).tolist()))
+    handle.write("]\n")
+
+
+def _prim_name(name):
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def _write_prototype(handle, spec, path_indent):
+    indent = path_indent + "    "
+    handle.write('{}def Xform "{}"\n{}{{\n'.format(path_indent, _prim_name(spec["group"]), path_indent))
+    for part in spec["parts"]:
+        points, counts, connects = primitive_mesh(part["command"], part["args"])
+        points = points + (0.0, part["offset"], 0.0)
+        handle.write('{}def Mesh "{}"\n{}{{\n'.format(indent, _prim_name(part["name"]), indent))
+        inner = indent + "    "
+        _write_array(handle, inner, "int[] faceVertexCounts", np.asarray(counts), INTEGER)
+        _write_array(handle, inner, "int[] faceVertexIndices", np.asarray(connects), INTEGER)
+        _write_array(handle, inner, "point3f[] points", points, VECTOR)
+        handle.write('{}color3f[] primvars:displayColor = [({}, {}, {})]\n'.format(inner, *part["color"]))
+        handle.write('{}uniform token subdivisionScheme = "none"\n'.format(inner))
+        handle.write('{}}}\n'.format(indent))
+    handle.write('{}}}\n'.format(path_indent))
+
+
+def write_usda(path, layout, specs, chunk_size=CHUNK_SIZE):
+    # One PointInstancer for the whole layout, with each used tree type's
+    # prototype written once underneath it.
+    type_ids = np.unique(layout["type_id"])
+    proto_index = np.zeros(len(TREE_TYPES), dtype=np.int64)
+    proto_index[type_ids] = np.arange(len(type_ids))
+    specs = [specs[TREE_TYPES[type_id]] for type_id in type_ids.tolist()]
+    root = "/Forest/Trees/Prototypes/"
+
+    with open(path, "w") as handle:
+        handle.write('#usda 1.0\n(\n    defaultPrim = "Forest"\n    upAxis = "Y"\n)\n\n')
+        handle.write('def Xform "Forest"\n{\n    def PointInstancer "Trees"\n    {\n')
+        indent = "        "
+        handle.write("{}rel prototypes = [{}]\n".format(
+            indent, ", ".join("<{}{}>".format(root, _prim_name(spec["group"])) for spec in specs)))
+        _write_array(handle, indent, "int[] protoIndices", layout["type_id"], INTEGER, chunk_size,
+                     lambda type_id: proto_index[type_id])
+        _write_array(handle, indent, "point3f[] positions", layout["position"], VECTOR, chunk_size)
+        _write_array(handle, indent, "quath[] orientations", layout["rotation"], QUATERNION, chunk_size,
+                     euler_to_quaternions)
+        _write_array(handle, indent, "float3[] scales", layout["scale"], VECTOR, chunk_size,
+                     lambda scale: np.repeat(scale[:, np.newaxis], 3, axis=1))
+        handle.write("\n")
+        handle.write('{}def Scope "Prototypes"\n{}{{\n'.format(indent, indent))
+        for spec in specs:
+            _write_prototype(handle, spec, indent + "    ")
+        handle.write("{}}}\n    }}\n}}\n".format(indent))
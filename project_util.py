@@ -1,20 +1,64 @@
-import maya.cmds as cmds
-import random
+import numpy as np
+import time
+
+from project_backend import default_backend
+from project_placement import (GROUND_SIZE, TRIANGLE_VERTS, CIRCLE_RADIUS, CIRCLE_SIDES, LAYOUT_DTYPE,
+                               TREE_TYPES, DEFAULT_VARIATION, make_layout, place_trees)
+from project_spacing import TREE_RADII, SpatialHashGrid, poisson_trees
+from project_writer import get_writer, report_throughput, undo_chunk
+from project_shading import MaterialRegistry
+from project_registry import CACHE_SET, NodeRegistry
+from project_prototypes import PrototypeLibrary
+from project_terrain import HeightField, align_rotations, slope_mask
+from project_density import DensityMap, load_density
+from project_bake import BAKE_GROUP, BAKE_SOURCE_GROUP, bake_batches
+from project_tiles import TiledForest
+from project_layout_file import read_layout, write_layout
+from project_usd import write_usda
+from project_profile import StageProfiler, profiled
+from project_lod import LOD_DISTANCES, select_lods
+
+FOREST_GROUP = "ForestBuilder_Forest"
+
+SCATTER_MODES = ["Duplicate", "Instance"]
+DISTRIBUTIONS = ["Uniform", "Poisson Disk", "Density Map"]
 
 class ForestBuilderLogic:
+    def __init__(self, backend=None, seed=None):
+        self.scene = backend if backend is not None else default_backend()
+        # The root seed is kept so tiles and saved layouts can be regenerated from it.
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.rng = np.random.default_rng(self.seed)
+        self.ground_type = "None"
+        self.ground_obj = None
+        self.terrain = None
+        self.custom_terrain = False
+        self.max_slope = 90.0
+        self.align_to_slope = False
+        self.density_values = None
+        self.density_map = None
+        self.density_multipliers = {tree_type: 1.0 for tree_type in TREE_TYPES}
+        self.variation = dict(DEFAULT_VARIATION)
+        self.spacing_grid = SpatialHashGrid()
+        self.placed = []
+        self.placed_nodes = []
+        self.placed_lods = np.zeros(0, dtype=np.uint8)
+        self.profiler = StageProfiler(self.scene)
+        self.registry = NodeRegistry(self.scene)
+        self.cache_registry = NodeRegistry(self.scene, CACHE_SET)
+        self.materials = MaterialRegistry(self.scene, self.cache_registry)
+        self.prototypes = PrototypeLibrary(self.scene, self.cache_registry, self.materials)
+        self.tiles = TiledForest(self)
+
     def assign_color(self, obj_name, color_rgb, shader_name):
-        if not cmds.objExists(shader_name):
-            material = cmds.shadingNode('lambert', asShader=True, name=shader_name)
-            cmds.setAttr(material + ".color", color_rgb[0], color_rgb[1], color_rgb[2], type="double3")
-            shading_group = cmds.sets(renderable=True, noSurfaceShader=True, empty=True, name=shader_name + "SG")
-            cmds.connectAttr(material + ".outColor", shading_group + ".surfaceShader", force=True)
-        else:
-            shading_group = shader_name + "SG"
-        cmds.select(obj_name)
-        cmds.hyperShade(assign=shading_group)
-        cmds.select(clear=True)
+        self.materials.queue(obj_name, color_rgb, shader_name)
 
+    @profiled("create_ground")
     def create_ground(self, ground_type):
+        self.ground_type = ground_type
+        self.ground_obj = None
+        self.terrain = None
+        self.custom_terrain = False
         if ground_type == "Flat Plane":
             ground_obj = self.create_flat_plane()
             self.assign_color(ground_obj, (0.2, 0.6, 0.2), "FlatPlane_Mat")
@@ -24,91 +68,312 @@ class ForestBuilderLogic:
         elif ground_type == "Circle":
             ground_obj = self.create_circle()
             self.assign_color(ground_obj, (0.6, 0.5, 0.3), "Circle_Mat")
+        else:
+            return
+        self.registry.add(ground_obj)
+        with self.profiler.stage("assign_color"):
+            self.materials.flush()
+        self.ground_obj = ground_obj
+        self.refresh_terrain()
+
+    def set_terrain(self, mesh_name):
+        self.ground_obj = mesh_name
+        self.custom_terrain = True
+        self.refresh_terrain()
+
+    def refresh_terrain(self):
+        # Reads the ground mesh once per call; plan_trees only touches the cached arrays.
+        if self.ground_obj is None or not self.scene.objExists(self.ground_obj):
+            self.terrain = None
+            return
+        self.terrain = HeightField(*self.scene.mesh_arrays(self.ground_obj))
+
+    def load_density_map(self, path):
+        self.density_values = load_density(path)
+        self.density_map = None
+
+    def current_density_map(self):
+        # The image is decoded once; only its mapping onto the ground is rebuilt per ground type.
+        if self.density_values is None:
+            return None
+        if self.density_map is None or self.density_map.ground_type != self.ground_type:
+            self.density_map = DensityMap(self.density_values, self.ground_type)
+        return self.density_map
+
+    def conform_to_terrain(self, layout):
+        if self.terrain is None:
+            return layout, np.ones(len(layout), dtype=bool)
+        xz = layout["position"][:, [0, 2]]
+        y, normals, hit = self.terrain.query(xz)
+        if not self.custom_terrain and not hit.all():
+            # Built-in grounds are sampled as true shapes, but the Circle mesh is a polygon:
+            # samples in the slivers outside it take the height just inside the rim.
+            miss = ~hit
+            y[miss], normals[miss], _ = self.terrain.query(xz[miss] * np.cos(np.pi / CIRCLE_SIDES))
+            hit = np.ones(len(layout), dtype=bool)
+        keep = hit & slope_mask(normals, self.max_slope)
+        layout = layout[keep]
+        layout["position"][:, 1] = y[keep]
+        if self.align_to_slope:
+            layout["rotation"] = align_rotations(normals[keep], layout["rotation"][:, 1])
+        return layout, keep
 
     def create_flat_plane(self):
-        cmds.polyCube(name="FlatPlane", width=10, height=0.1, depth=10, sx=5, sy=1, sz=5)
-        return "FlatPlane"
+        return self.scene.polyCube(name="FlatPlane", width=GROUND_SIZE, height=0.1, depth=GROUND_SIZE,
+                                   sx=5, sy=1, sz=5)[0]
 
     def create_triangle_flat(self):
-        verts = [(0, 0, 5), (5, 0, -5), (-5, 0, -5)]
-        triangle = cmds.polyCreateFacet(p=verts, n="Triangle")[0]
+        triangle = self.scene.polyCreateFacet(p=TRIANGLE_VERTS, n="Triangle")[0]
         return triangle
 
     def create_circle(self):
-        cmds.polyCylinder(name="Circle", radius=5, height=0.1, sx=20, sy=1, sz=1)
-        return "Circle"
+        return self.scene.polyCylinder(name="Circle", radius=CIRCLE_RADIUS, height=0.1,
+                                       sx=CIRCLE_SIDES, sy=1, sz=1)[0]
 
     
+    @profiled("create_tree")
     def create_tree(self, tree_type):
-        if tree_type == "Fin Tree":
-            self.create_tree1()
-        elif tree_type == "Square Tree":
-            self.create_tree2()
-        elif tree_type == "Circle Tree":
-            self.create_tree3()
-
-    def create_tree1(self):
-        trunk = cmds.polyCylinder(name="FinTree_Trunk", radius=0.2, height=2)[0]
-        leaves = cmds.polyCone(name="FinTree_Leaves", radius=1, height=3)[0]
-        cmds.move(0, 2.5, 0, leaves)
-        cmds.group(trunk, leaves, name="FinTree_Group")
-        self.assign_color(trunk, (0.55, 0.35, 0.2), "Trunk_Mat")
-        self.assign_color(leaves, (0.1, 0.5, 0.2), "Pine_Leaves_Mat")
-
-    def create_tree2(self):
-        trunk = cmds.polyCube(name="SquareTree_Trunk", width=0.5, height=1.5, depth=0.5)[0]
-        leaves = cmds.polyCube(name="SquareTree_Leaves", width=2, height=2, depth=2)[0]
-        cmds.move(0, 1.75, 0, leaves)
-        cmds.group(trunk, leaves, name="SquareTree_Group")
-        self.assign_color(trunk, (0.45, 0.25, 0.1), "Trunk_Mat")
-        self.assign_color(leaves, (0.2, 0.65, 0.3), "Block_Leaves_Mat")
-
-    def create_tree3(self):
-        trunk = cmds.polyCylinder(name="CircleTree_Trunk", radius=0.1, height=1)[0]
-        leaves = cmds.polySphere(name="CircleTree_Leaves", radius=1.5)[0]
-        cmds.move(0, 2, 0, leaves)
-        cmds.group(trunk, leaves, name="CircleTree_Group")
-        self.assign_color(trunk, (0.6, 0.4, 0.2), "Trunk_Mat")
-        self.assign_color(leaves, (0.35, 0.7, 0.15), "Bush_Leaves_Mat")
+        if tree_type not in self.prototypes.specs:
+            return
+        with self.profiler.stage("build_prototypes"):
+            source = self.prototypes.get(tree_type)
+        layout = np.zeros(1, dtype=LAYOUT_DTYPE)
+        layout["type_id"] = TREE_TYPES.index(tree_type)
+        layout["scale"] = 1.0
+        layout["value"] = 1.0
+        with self.profiler.stage("write_trees"):
+            trees = get_writer("Commands", self.scene).write(layout, source, "Instance", self.forest_group())
+        self.record_trees(layout, trees)
+        self.spacing_grid.insert(0.0, 0.0, TREE_RADII[tree_type])
+
+    def forest_group(self):
+        if not self.scene.objExists(FOREST_GROUP):
+            self.scene.createNode("transform", name=FOREST_GROUP)
+            self.registry.add(FOREST_GROUP)
+        return FOREST_GROUP
 
     
-    def add_more_trees(self, tree_type, count):
+    def plan_trees(self, tree_type, count, distribution="Uniform"):
+        # Pure placement math, safe to run off the main thread.
+        if distribution == "Poisson Disk":
+            planned = poisson_trees(self.spacing_grid, self.ground_type, tree_type, count, self.rng,
+                                    variation=self.variation)
+            layout, keep = self.conform_to_terrain(planned)
+            self.forget_trees(planned[~keep])
+            return layout
+        density_map = self.current_density_map() if distribution == "Density Map" else None
+        if density_map is not None:
+            count = int(round(count * self.density_multipliers.get(tree_type, 1.0)))
+            xz = density_map.sample(count, self.rng)
+            layout = make_layout(xz, TREE_TYPES.index(tree_type), self.rng, self.variation)
+        else:
+            layout = place_trees(self.ground_type, tree_type, count, self.rng, self.variation)
+        layout, keep = self.conform_to_terrain(layout)
+        self.spacing_grid.insert_many(layout["position"][:, [0, 2]], TREE_RADII[tree_type] * layout["scale"])
+        return layout
+
+    def forget_trees(self, layout):
+        # Drops planned trees that were never written from the spacing grid.
+        self.spacing_grid.remove_many(layout["position"][:, [0, 2]])
+
+    def iter_write_trees(self, layout, tree_type, mode="Duplicate", writer="Commands", chunk_size=500):
+        source = self.prototypes.get(tree_type)
+        parent = self.forest_group()
+        writer = get_writer(writer, self.scene)
+        for start in range(0, len(layout), chunk_size):
+            trees = writer.write(layout[start:start + chunk_size], source, mode, parent)
+            self.record_trees(layout[start:start + chunk_size], trees)
+            yield min(start + chunk_size, len(layout))
+
+    @profiled("add_more_trees")
+    def add_more_trees(self, tree_type, count, mode="Duplicate", distribution="Uniform", writer="Commands"):
         if tree_type == "None":
-            import maya.cmds as cmds
-            cmds.warning("กรุณาเลือกชนิดต้นไม้ก่อน")
+            self.scene.warning("กรุณาเลือกชนิดต้นไม้ก่อน")
+            return
+
+        if tree_type not in self.prototypes.specs:
             return
+        with self.profiler.stage("build_prototypes"):
+            source = self.prototypes.get(tree_type)
+
+        with self.profiler.stage("plan_trees"):
+            layout = self.plan_trees(tree_type, count, distribution)
+        if len(layout) < count:
+            self.scene.warning("วางต้นไม้ได้ {} จาก {} ต้น".format(len(layout), count))
+
+        start_nodes = self.scene.node_balance()
+        start_time = time.perf_counter()
+        writer = get_writer(writer, self.scene)
+        with undo_chunk(self.scene, "ForestBuilder Add Trees"), self.profiler.stage("write_trees"):
+            trees = writer.write(layout, source, mode, self.forest_group())
+        self.record_trees(layout, trees)
+        seconds = time.perf_counter() - start_time
+
+        stats = {
+            "mode": mode,
+            "writer": writer.name,
+            "trees": len(layout),
+            "nodes_added": self.scene.node_balance() - start_nodes,
+            "seconds": seconds,
+        }
+        stats["trees_per_second"] = report_throughput(writer.name, mode, len(layout), seconds)
+        return stats
+
+    def record_trees(self, layout, trees):
+        # New trees are written with the full-detail prototype.
+        self.placed.append(layout)
+        self.placed_nodes.append(list(trees))
+        self.placed_lods = np.concatenate((self.placed_lods, np.zeros(len(layout), dtype=np.uint8)))
+
+    def drop_undone_trees(self, first_record):
+        # Forgets trees recorded since first_record whose nodes an undo has removed.
+        # The newest tree is checked first, so the usual no-undo case costs one objExists.
+        names = self.placed_nodes[-1] if len(self.placed_nodes) > first_record else []
+        if not names or names[-1] is None or self.scene.objExists(names[-1]):
+            return 0
+        offset = sum(len(layout) for layout in self.placed[:first_record])
+        lods = [self.placed_lods[:offset]]
+        dropped = 0
+        for index in range(first_record, len(self.placed)):
+            layout, names = self.placed[index], self.placed_nodes[index]
+            keep = np.array([name is not None and self.scene.objExists(name) for name in names], dtype=bool)
+            self.forget_trees(layout[~keep])
+            lods.append(self.placed_lods[offset:offset + len(layout)][keep])
+            offset += len(layout)
+            self.placed[index] = layout[keep]
+            self.placed_nodes[index] = [name for name, kept in zip(names, keep.tolist()) if kept]
+            dropped += int((~keep).sum())
+        self.placed_lods = np.concatenate(lods)
+        return dropped
+
+    def placed_layout(self):
+        if not self.placed:
+            return np.zeros(0, dtype=LAYOUT_DTYPE)
+        return np.concatenate(self.placed)
+
+    def save_layout(self, path):
+        write_layout(path, self.placed_layout(), self.seed)
+
+    def apply_layout(self, path, mode="Instance", writer="Commands"):
+        # Writes a saved layout into the forest exactly as stored, one batch per tree type.
+        layout, seed = read_layout(path)
+        writer = get_writer(writer, self.scene)
+        with undo_chunk(self.scene, "ForestBuilder Apply Layout"):
+            for type_id in np.unique(layout["type_id"]).tolist():
+                rows = layout[layout["type_id"] == type_id]
+                source = self.prototypes.get(TREE_TYPES[type_id])
+                self.record_trees(rows, writer.write(rows, source, mode, self.forest_group()))
+        self.spacing_grid.insert_many(layout["position"][:, [0, 2]],
+                                      np.array([TREE_RADII[t] for t in TREE_TYPES])[layout["type_id"]] * layout["scale"])
+        return seed
+
+    def export_usd(self, path):
+        write_usda(path, self.placed_layout(), self.prototypes.specs)
+
+    def bake_forest(self, tile_size=None, keep_source=True):
+        # Rebuilds every placed tree as one mesh per material and tile, straight from the
+        # placement record, so a bake can be redone after adding trees. keep_source moves
+        # the baked trees into a hidden group instead of deleting them, so they stay
+        # editable while later trees still land in the visible forest group.
+        layout = self.placed_layout()
+        if not len(layout):
+            self.scene.warning("ยังไม่มีต้นไม้ให้ Bake")
+            return []
+
+        with undo_chunk(self.scene, "ForestBuilder Bake"):
+            if self.scene.objExists(BAKE_GROUP):
+                self.scene.delete(BAKE_GROUP)
+            self.scene.createNode("transform", name=BAKE_GROUP)
+            meshes = []
+            for material, color, tile, points, counts, connects in bake_batches(layout, self.prototypes.specs,
+                                                                                 tile_size):
+                name = "{}_Baked_{}_{}".format(material.replace("_Mat", ""), tile[0], tile[1])
+                mesh = self.scene.create_mesh(points, counts, connects, name, BAKE_GROUP)
+                self.materials.queue(mesh, color, material)
+                meshes.append(mesh)
+            self.materials.flush()
+            self.registry.add([BAKE_GROUP] + meshes)
+
+            # Trees baked by an earlier pass are already hidden or gone.
+            trees = [name for names in self.placed_nodes for name in names if name is not None]
+            if trees and keep_source:
+                if not self.scene.objExists(BAKE_SOURCE_GROUP):
+                    self.scene.createNode("transform", name=BAKE_SOURCE_GROUP)
+                    self.scene.setAttr(BAKE_SOURCE_GROUP + ".visibility", 0)
+                    self.registry.add(BAKE_SOURCE_GROUP)
+                self.scene.parent(trees, BAKE_SOURCE_GROUP)
+            elif trees:
+                self.scene.delete(trees)
+            # The record stays for re-baking, but baked trees no longer take part in LOD swaps.
+            self.placed = [layout]
+            self.placed_nodes = [[None] * len(layout)]
+        return meshes
+
+    def camera_position(self, camera=None):
+        if camera is None:
+            camera = "persp"
+            for panel in self.scene.getPanel(visiblePanels=True) or []:
+                if self.scene.getPanel(typeOf=panel) == "modelPanel":
+                    camera = self.scene.modelPanel(panel, query=True, camera=True)
+                    break
+        return np.array(self.scene.xform(camera, query=True, worldSpace=True, translation=True))
+
+    def update_lods(self, camera_position, distances=LOD_DISTANCES, writer="Commands"):
+        # Picks every tree's LOD from its camera distance in one pass and re-instances
+        # only the trees whose level changed.
+        if not self.scene.objExists(FOREST_GROUP):
+            self.scene.warning("ไม่พบต้นไม้สำหรับเปลี่ยน LOD")
+            return None
+        layout = self.placed_layout()
+        names = [name for trees in self.placed_nodes for name in trees]
+        lods = select_lods(layout["position"], camera_position, distances)
+        live = np.array([name is not None for name in names], dtype=bool)
+        lods[~live] = self.placed_lods[~live]
+        changed = lods != self.placed_lods
+
+        if changed.any():
+            writer = get_writer(writer, self.scene)
+            with undo_chunk(self.scene, "ForestBuilder LOD"):
+                self.scene.delete([names[index] for index in np.nonzero(changed)[0].tolist()])
+                for type_id in np.unique(layout["type_id"][changed]).tolist():
+                    for lod in np.unique(lods[changed]).tolist():
+                        rows = np.nonzero(changed & (layout["type_id"] == type_id) & (lods == lod))[0]
+                        if not len(rows):
+                            continue
+                        source = self.prototypes.get(TREE_TYPES[type_id], lod)
+                        trees = writer.write(layout[rows], source, "Instance", self.forest_group())
+                        for index, tree in zip(rows.tolist(), trees):
+                            names[index] = tree
+            self.placed = [layout]
+            self.placed_nodes = [names]
+            self.placed_lods = lods
 
-        for i in range(count):
-            if tree_type == "Fin Tree":
-                tree = cmds.duplicate("FinTree_Group")[0]
-            elif tree_type == "Square Tree":
-                tree = cmds.duplicate("SquareTree_Group")[0]
-            elif tree_type == "Circle Tree":
-                tree = cmds.duplicate("CircleTree_Group")[0]
-            else:
-                continue
-
-            x = random.uniform(-5, 5)
-            z = random.uniform(-5, 5)
-            y = 0
-            cmds.move(x, y, z, tree)
+        faces = np.zeros((len(TREE_TYPES), len(distances) + 1), dtype=np.int64)
+        for type_id in np.unique(layout["type_id"]).tolist():
+            faces[type_id] = [self.prototypes.face_count(TREE_TYPES[type_id], lod)
+                              for lod in range(len(distances) + 1)]
+        full = int(faces[layout["type_id"], 0].sum())
+        shown = int(faces[layout["type_id"], lods].sum())
+        stats = {
+            "trees": len(layout),
+            "swapped": int(changed.sum()),
+            "levels": np.bincount(lods, minlength=len(distances) + 1).tolist(),
+            "faces": shown,
+            "faces_saved": full - shown,
+        }
+        return stats
 
     
-    def cleanup_existing_elements(self):
-        try:
-            for g in ["FlatPlane", "Triangle", "Circle"]:
-                if cmds.objExists(g):
-                    cmds.delete(g)
-
-            all_trees = cmds.ls("*Tree*_Group*")
-            if all_trees:
-                cmds.delete(all_trees)
-
-            for shader_name in ["FlatPlane_Mat", "Triangle_Mat", "Circle_Mat",
-                                "Trunk_Mat", "Pine_Leaves_Mat", "Block_Leaves_Mat", "Bush_Leaves_Mat"]:
-                if cmds.objExists(shader_name):
-                    cmds.delete(shader_name)
-                if cmds.objExists(shader_name + "SG"):
-                    cmds.delete(shader_name + "SG")
-        except Exception:
-            pass
+    @profiled("cleanup_existing_elements")
+    def cleanup_existing_elements(self, keep_prototypes=False):
+        # Generate keeps the prototype cache and materials; Restart drops everything.
+        self.spacing_grid.clear()
+        self.placed = []
+        self.placed_nodes = []
+        self.placed_lods = np.zeros(0, dtype=np.uint8)
+        self.registry.delete_all()
+        self.tiles.forget()
+        if not keep_prototypes:
+            self.cache_registry.delete_all()
+            self.materials.forget()
+            self.prototypes.forget()
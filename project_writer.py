@@ -0,0 +1,105 @@
+import contextlib
+import os
+import time
+
+from project_placement import has_color_variation
+
+WRITERS = ["Commands", "API"]
+
+# Per-tree colour variation lives on each tree's own transform; Arnold exposes
+# mtoa_constant_* attributes to the shared aiUserDataFloat nodes in the material.
+HUE_ATTR = "mtoa_constant_fbHue"
+VALUE_ATTR = "mtoa_constant_fbValue"
+
+
+@contextlib.contextmanager
+def undo_chunk(scene, name):
+    scene.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        scene.undoInfo(closeChunk=True)
+
+
+def load_writer_plugin(scene):
+    import project_writer_plugin
+
+    if not scene.pluginInfo(project_writer_plugin.PLUGIN_NAME, query=True, loaded=True):
+        scene.loadPlugin(os.path.abspath(project_writer_plugin.__file__), quiet=True)
+
+
+class CmdsSceneWriter:
+    name = "Commands"
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def write(self, layout, source, mode, parent=None):
+        scene = self.scene
+        colored = has_color_variation(layout)
+        trees = []
+        for position, rotation, scale, hue, value in zip(layout["position"].tolist(),
+                                                         layout["rotation"].tolist(),
+                                                         layout["scale"].tolist(),
+                                                         layout["hue"].tolist(),
+                                                         layout["value"].tolist()):
+            if mode == "Instance":
+                tree = scene.instance(source)[0]
+            else:
+                tree = scene.duplicate(source)[0]
+            scene.xform(tree, translation=position, rotation=rotation, scale=(scale, scale, scale))
+            if colored:
+                scene.addAttr(tree, longName=HUE_ATTR, attributeType="float", defaultValue=hue)
+                scene.addAttr(tree, longName=VALUE_ATTR, attributeType="float", defaultValue=value)
+            trees.append(tree)
+        if parent is not None and trees:
+            trees = scene.parent(trees, parent)
+        return trees
+
+
+class ApiSceneWriter:
+    name = "API"
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def write(self, layout, source, mode, parent=None):
+        import project_writer_plugin
+
+        load_writer_plugin(self.scene)
+        project_writer_plugin.pending.append((layout, source, mode, parent))
+        return self.scene.forestBuilderWrite() or []
+
+
+def get_writer(name, scene):
+    if name == "API":
+        if scene.is_maya:
+            return ApiSceneWriter(scene)
+        scene.warning("API writer ใช้ได้เฉพาะใน Maya จะใช้ Commands แทน")
+    return CmdsSceneWriter(scene)
+
+
+def report_throughput(writer_name, mode, trees, seconds):
+    rate = trees / seconds if seconds > 0 else float("inf")
+    print("ForestBuilder: {} writer, {} mode: {} trees in {:.3f}s ({:.0f} trees/s)".format(
+        writer_name, mode, trees, seconds, rate))
+    return rate
+
+
+def measure_throughput(scene, source, layout, modes=("Duplicate", "Instance")):
+    # Writes the same layout with both writers, undoes each batch, and reports trees/s.
+    # Outside Maya only the Commands writer exists.
+    results = {}
+    for writer_name in WRITERS if scene.is_maya else ["Commands"]:
+        writer = get_writer(writer_name, scene)
+        for mode in modes:
+            start = time.perf_counter()
+            with undo_chunk(scene, "ForestBuilder Benchmark"):
+                trees = writer.write(layout, source, mode)
+            seconds = time.perf_counter() - start
+            results[(writer.name, mode)] = report_throughput(writer.name, mode, len(layout), seconds)
+            if scene.is_maya:
+                scene.undo()
+            else:
+                scene.delete(trees)
+    return results
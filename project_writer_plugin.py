@@ -0,0 +1,155 @@
+import math
+import os
+
+import maya.api.OpenMaya as om
+
+from project_placement import has_color_variation
+from project_writer import HUE_ATTR, VALUE_ATTR
+
+PLUGIN_NAME = os.path.splitext(os.path.basename(__file__))[0]
+COMMAND_NAME = "forestBuilderWrite"
+MESH_COMMAND_NAME = "forestBuilderCreateMesh"
+
+# Batch handed from ApiSceneWriter to the command, which pops it in doIt.
+pending = []
+# (points, counts, connects, name, parent) handed from MayaSceneBackend.create_mesh.
+pending_meshes = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ForestBuilderWriteCommand(om.MPxCommand):
+    def __init__(self):
+        super().__init__()
+        self.batch = None
+        self.created = []
+
+    @staticmethod
+    def creator():
+        return ForestBuilderWriteCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        self.batch = pending.pop()
+        self.redoIt()
+
+    def redoIt(self):
+        layout, source, mode, parent = self.batch
+        source_obj = om.MSelectionList().add(source).getDependNode(0)
+        source_fn = om.MFnDagNode(source_obj)
+        parent_obj = om.MSelectionList().add(parent).getDependNode(0) if parent else om.MObject.kNullObj
+
+        # One modifier creates every transform; shapes are then shared or copied in bulk.
+        if mode == "Instance":
+            modifier = om.MDagModifier()
+            roots = [modifier.createNode("transform", parent_obj) for _ in range(len(layout))]
+            for root in roots:
+                modifier.renameNode(root, source + "1")
+            modifier.doIt()
+            children = [source_fn.child(i) for i in range(source_fn.childCount())]
+            for root in roots:
+                root_fn = om.MFnDagNode(root)
+                for child in children:
+                    root_fn.addChild(child, om.MFnDagNode.kNextPos, True)
+        else:
+            roots = [source_fn.duplicate(False, False) for _ in range(len(layout))]
+            modifier = om.MDagModifier()
+            for root in roots:
+                modifier.reparentNode(root, parent_obj)
+            modifier.doIt()
+
+        names = []
+        for root, position, rotation, scale in zip(roots,
+                                                   layout["position"].tolist(),
+                                                   layout["rotation"].tolist(),
+                                                   layout["scale"].tolist()):
+            transform = om.MFnTransform(root)
+            transform.setTranslation(om.MVector(position), om.MSpace.kTransform)
+            transform.setRotation(om.MEulerRotation([math.radians(r) for r in rotation]), om.MSpace.kTransform)
+            transform.setScale([scale, scale, scale])
+            names.append(transform.partialPathName())
+
+        if has_color_variation(layout):
+            self.add_variation(roots, layout)
+
+        self.created = roots
+        self.setResult(names)
+
+    def add_variation(self, roots, layout):
+        modifier = om.MDGModifier()
+        numeric = om.MFnNumericAttribute()
+        attributes = []
+        for root in roots:
+            hue = numeric.create(HUE_ATTR, HUE_ATTR, om.MFnNumericData.kFloat, 0.0)
+            value = numeric.create(VALUE_ATTR, VALUE_ATTR, om.MFnNumericData.kFloat, 1.0)
+            modifier.addAttribute(root, hue)
+            modifier.addAttribute(root, value)
+            attributes.append((hue, value))
+        modifier.doIt()
+        for root, (hue, value), hue_value, value_value in zip(roots, attributes,
+                                                              layout["hue"].tolist(),
+                                                              layout["value"].tolist()):
+            node = om.MFnDependencyNode(root)
+            node.findPlug(hue, False).setFloat(hue_value)
+            node.findPlug(value, False).setFloat(value_value)
+
+    def undoIt(self):
+        modifier = om.MDagModifier()
+        for root in self.created:
+            modifier.deleteNode(root)
+        modifier.doIt()
+        self.created = []
+
+
+class ForestBuilderCreateMeshCommand(om.MPxCommand):
+    # MFnMesh.create on its own is invisible to undo; run inside a command it
+    # can be taken back with the rest of a Bake chunk.
+    def __init__(self):
+        super().__init__()
+        self.mesh = None
+        self.created = None
+
+    @staticmethod
+    def creator():
+        return ForestBuilderCreateMeshCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        self.mesh = pending_meshes.pop()
+        self.redoIt()
+
+    def redoIt(self):
+        points, counts, connects, name, parent = self.mesh
+        parent_obj = om.MSelectionList().add(parent).getDependNode(0) if parent else om.MObject.kNullObj
+        modifier = om.MDagModifier()
+        transform = modifier.createNode("transform", parent_obj)
+        modifier.renameNode(transform, name)
+        modifier.doIt()
+        shape = om.MFnMesh().create(om.MPointArray(points), counts, connects, parent=transform)
+        om.MFnDependencyNode(shape).setName(om.MFnDependencyNode(transform).name() + "Shape")
+        self.created = transform
+        self.setResult(om.MFnDagNode(transform).partialPathName())
+
+    def undoIt(self):
+        modifier = om.MDagModifier()
+        modifier.deleteNode(self.created)
+        modifier.doIt()
+        self.created = None
+
+
+def initializePlugin(plugin):
+    fn = om.MFnPlugin(plugin)
+    fn.registerCommand(COMMAND_NAME, ForestBuilderWriteCommand.creator)
+    fn.registerCommand(MESH_COMMAND_NAME, ForestBuilderCreateMeshCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    fn = om.MFnPlugin(plugin)
+    fn.deregisterCommand(COMMAND_NAME)
+    fn.deregisterCommand(MESH_COMMAND_NAME)